@@ -13,4 +13,8 @@ setup(name='spectrochempy_gui',
       platforms=['Windows', 'Mac OS X', 'Linux'],  # packages discovery
       zip_safe=False,
       python_requires=">=3.6.9",
-      setup_requires=['setuptools_scm'], packages=find_packages(), )
+      setup_requires=['setuptools_scm'],
+      install_requires=['PyYAML'],  # libyaml is used when available (faster C loader)
+      packages=find_packages(),
+      include_package_data=True,
+      package_data={'spectrochempy_gui': ['processors.yaml']}, )
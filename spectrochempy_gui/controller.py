@@ -9,18 +9,39 @@
 Controller module.
 
 """
-from functools import partial
+from copy import deepcopy
 from importlib import import_module
+import json
+import weakref
 from collections import OrderedDict
+from pathlib import Path
 
 import yaml
 import numpy as np
 
+try:
+    from yaml import CSafeLoader as YamlLoader  # libyaml based loader
+except ImportError:  # pragma: no cover
+    from yaml import SafeLoader as YamlLoader
+
 import spectrochempy as scp
 
+from spectrochempy_gui.pyqtgraph.Qt import QtCore
 from spectrochempy_gui.pyqtgraph.parametertree import (Parameter, ParameterTree, parameterTypes, registerParameterType)
 from spectrochempy_gui.utils import info_msg
-from spectrochempy_gui.model import Regions
+from spectrochempy_gui.model import Regions, parseSpan
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+_PROCESSORS = None  # parsed content of processors.yaml (read only once)
+
+
+def _readProcessors():
+    global _PROCESSORS
+    if _PROCESSORS is None:
+        # libyaml reads the raw bytes directly (no decoding through a text stream)
+        _PROCESSORS = yaml.load((Path(__file__).parent / 'processors.yaml').read_bytes(), Loader=YamlLoader)
+    return _PROCESSORS
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -28,9 +49,10 @@ def getProcessors(key='processing'):
     """
     Read processor informations from a yaml file.
 
+    The file is parsed only once; a deep copy is returned as the entries are modified by the callers.
+
     """
-    with open('processors.yaml') as f:
-        procs = yaml.load(f, Loader=yaml.FullLoader)
+    procs = deepcopy(_readProcessors())
 
     for k, v in procs[key].items():
         v.update({
@@ -56,6 +78,32 @@ def getProcessors(key='processing'):
     return procs[key]
 
 
+# ----------------------------------------------------------------------------------------------------------------------
+def rangesMask(xdata, ranges):
+    """
+    Return a boolean array which is True where xdata lies in one of the (low, high) ranges.
+
+    """
+    mask = np.zeros(xdata.shape, dtype=bool)
+    if not len(ranges):
+        return mask
+    bounds = np.sort(np.asarray(ranges, dtype=float), axis=1)
+
+    # coordinates are generally monotonic: a binary search of the bounds is then enough
+    descending = xdata.size > 1 and xdata[0] > xdata[-1]
+    xs = xdata[::-1] if descending else xdata
+    if np.all(xs[1:] >= xs[:-1]):
+        starts = np.searchsorted(xs, bounds[:, 0], side='left')
+        ends = np.searchsorted(xs, bounds[:, 1], side='right')
+        for start, end in zip(starts, ends):
+            mask[start:end] = True
+        return mask[::-1] if descending else mask
+
+    for low, up in bounds:
+        mask |= (xdata >= low) & (xdata <= up)
+    return mask
+
+
 # ----------------------------------------------------------------------------------------------------------------------
 class RegionGroup(parameterTypes.GroupParameter):
 
@@ -68,7 +116,22 @@ class RegionGroup(parameterTypes.GroupParameter):
 
         scp.debug_('New region group added')
         self.sigChildAdded.connect(self.addRegion)
+        self.sigChildRemoved.connect(self.updateSpans)
         self.current_index = 0
+        self._controllerRef = None
+
+        # spans of the ranges as a (M, 2) array (the string value of the ranges parameters are for display)
+        self.spans = np.empty((0, 2))
+
+    # ..................................................................................................................
+    @property
+    def controller(self):
+        # The controller is the parent of the top `params` group: resolve it once and keep a weak reference
+        controller = self._controllerRef() if self._controllerRef is not None else None
+        if controller is None:
+            controller = self.parent().parent().parent().parent()
+            self._controllerRef = weakref.ref(controller)
+        return controller
 
     # ..................................................................................................................
     def addRegion(self, param, child, pos):
@@ -77,26 +140,34 @@ class RegionGroup(parameterTypes.GroupParameter):
 
         if child.value() == 'undefined':
             # dimension
-            dim = self.parent().parent().parent().parent().dataset.dims[-1]
+            controller = self.controller
+            dim = controller.dim
             # default span
-            rangex = np.array(self.parent().parent().parent().parent().parent.plotwidget.p.getAxis('bottom').range)
+            rangex = np.array(controller.parent.plotwidget.p.getAxis('bottom').range)
             x = rangex.mean()
             w = rangex.ptp() / 50
             span = (x - w, x + w)
         else:
-            dim, span = child.value().split('> ')
-            span = eval(span)
+            dim, span = parseSpan(child.value())
 
         # add it
+        child.sigValueChanged.connect(self.updateSpans)
         self.parent().regions.addRegion(child, kind=kind, span=span, dim=dim)
+        self.updateSpans()
         scp.debug_(f'> new {kind} region added to the regions (index: {self.current_index})')
 
+    # ..................................................................................................................
+    def updateSpans(self, *args):
+
+        spans = [parseSpan(child.value())[1] for child in self.children() if child.value() != 'undefined']
+        self.spans = np.array(spans, dtype=float).reshape(-1, 2)
+
     # ..................................................................................................................
     def addNew(self, span=None):
 
         kind = self.parent().param('kind').value()
         if kind == 'undefined':
-            info_msg(self.parent().parent().parent().parent(), 'Warning',
+            info_msg(self.controller, 'Warning',
                      'Warning: kind is undefined.\n\nSelecting a kind is required before trying to add a region!')
             return
 
@@ -109,6 +180,9 @@ class RegionGroup(parameterTypes.GroupParameter):
                                readonly=True,
                                removable=True,
                                ))
+        # tag it for fast lookup (see Controller.isRegion and Controller.topGroup)
+        range._topGroup = self.parent()._topGroup
+        range._regionRoot = self.parent()
 
         self.current_index += 1
 
@@ -131,17 +205,48 @@ class ProcessGroup(parameterTypes.GroupParameter):
 
         self.current_index = 0
         self._restoring = False
+        self.regionsPool = []
+        # the `define regions` children (with their Regions object)
+        self.regionChildren = []
+
+        self._topGroup = self
+        for child in self.children():
+            child._topGroup = self
 
         self.sigStateChanged.connect(self.processgroupChanged)
 
     def processgroupChanged(self, group, change, info):
 
-        if change == 'childAdded' and info[0].name().startswith('define region'):
-
+        if change == 'childAdded' and info[0].name().startswith('define region') and not hasattr(info[0], 'regions'):
+            # (already existing regions are kept when a child is only moved)
             child = info[0]
-            child.regions = Regions()
+            child.regions = self.regionsPool.pop() if self.regionsPool else Regions()
             child.param('kind').sigStateChanged.connect(child.regions.change)
-            child.sigRemoved.connect(child.regions.remove)
+            child.sigRemoved.connect(self.releaseRegions)
+            self.regionChildren.append(child)
+
+    # ..................................................................................................................
+    def releaseRegions(self, child):
+
+        # The regions of a removed `define regions` child are cleared and kept for reuse by a future child
+        regions = child.regions
+        del child.regions
+        self.regionChildren.remove(child)
+        try:
+            child.param('kind').sigStateChanged.disconnect(regions.change)
+        except (TypeError, RuntimeError):  # already disconnected
+            pass
+        regions.clear()
+        self.regionsPool.append(regions)
+
+    # ..................................................................................................................
+    def clearChildren(self):
+
+        # children are removed without emitting sigRemoved (e.g., when the state is restored)
+        for child in self.childs:
+            if hasattr(child, 'regions'):
+                self.releaseRegions(child)
+        super().clearChildren()
 
     # ..................................................................................................................
     def addNew(self, key):
@@ -152,6 +257,14 @@ class ProcessGroup(parameterTypes.GroupParameter):
         item['name'] = name
 
         child = self.insertChild(len(self.childs)-1, item)
+
+        # tag the new parameters, so that we don't need to walk up the tree to find their processing group or
+        # their define regions parent when events occur.
+        regionRoot = child if key == 'define regions' else None
+        for par in [child] + child.children():
+            par._topGroup = self
+            par._regionRoot = regionRoot
+
         scp.debug_(f"New processor added: {name}")
         self.current_index += 1
         return child
@@ -168,6 +281,8 @@ class ProcessGroup(parameterTypes.GroupParameter):
                 del state['children'][key]
 
         super().restoreState(state, **kwargs)
+        for child in self.children():
+            child._topGroup = self
 
         # now we can add the define region entries
         for key in state_children.keys():
@@ -198,8 +313,14 @@ class Controller(ParameterTree):
     params = None
 
     _dataset = None
+    _dim = None
     _processed = None
     _params = None
+    _actionsCache = None
+    _lastProcessing = None
+
+    # types of tree changes which may affect the processing (the others, e.g., 'options' are only cosmetic)
+    processingChanges = ('value', 'childAdded', 'childRemoved', 'parent', 'contextMenu')
 
     # ..................................................................................................................
     def __init__(self, parent):
@@ -207,9 +328,18 @@ class Controller(ParameterTree):
         super().__init__(showHeader=False)
 
         self.parent = parent
+        self._actionFunctions = {}
+
+        # changes of the parameters tree are coalesced before being applied (see change)
+        self._pendingChanges = []
+        self._changeTimer = QtCore.QTimer()
+        self._changeTimer.setSingleShot(True)
+        self._changeTimer.setInterval(30)
+        self._changeTimer.timeout.connect(self.applyChanges)
+
         self.itemClicked.connect(self.selectRegion)
-        self.itemExpanded.connect(partial(self.showRegions, True))
-        self.itemCollapsed.connect(partial(self.showRegions, False))
+        self.itemExpanded.connect(self.onItemExpanded)
+        self.itemCollapsed.connect(self.onItemCollapsed)
 
     # ..................................................................................................................
     @property
@@ -221,6 +351,14 @@ class Controller(ParameterTree):
         if not self.isInitializing:
             self.parent.plotwidget.draw(dataset, False)
         self._dataset = dataset
+        self._dim = dataset.dims[-1] if dataset is not None else None
+
+    # ..................................................................................................................
+    @property
+    def dim(self):
+        # Name of the last dimension of the current dataset (updated each time the dataset is set, as the
+        # processing may transpose it)
+        return self._dim
 
     # ..................................................................................................................
     @property
@@ -232,25 +370,26 @@ class Controller(ParameterTree):
     def params(self):
         return self._params
 
+    # ..................................................................................................................
+    def setProjectActionsEnabled(self, enabled):
+
+        # The menus are updated by Qt action events, so the `changed` signals of the actions can be blocked
+        for action in (self.parent.save_action, self.parent.save_as_action, self.parent.close_action,
+                       self.parent.add_dataset_action):
+            action.blockSignals(True)
+            action.setEnabled(enabled)
+            action.blockSignals(False)
+
     # ..................................................................................................................
     def onProjectChanged(self, change):
 
-        if change in ['opened', 'renamed', 'dataset added', 'dataset removed']:
-            self.parent.save_action.setDisabled(False)
-            self.parent.save_as_action.setDisabled(False)
-            self.parent.close_action.setDisabled(False)
-            self.parent.add_dataset_action.setDisabled(False)
+        if change in ['opened', 'renamed', 'dataset added', 'dataset removed', 'bulk']:
+            self.setProjectActionsEnabled(True)
             self.parent.projectwidget.setProject(self.parent.project())
-            if len(self.parent.project().datasets) < 1:
-                self.parent.remove_dataset_action.setDisabled(True)
-            else:
-                self.parent.remove_dataset_action.setDisabled(False)
+            self.parent.remove_dataset_action.setEnabled(len(self.parent.project().datasets) > 0)
 
         if change == 'closed':
-            self.parent.save_action.setDisabled(True)
-            self.parent.save_as_action.setDisabled(True)
-            self.parent.close_action.setDisabled(True)
-            self.parent.add_dataset_action.setDisabled(True)
+            self.setProjectActionsEnabled(False)
             self.parent.projectwidget.setProject(None)
             self.onDatasetChanged(None)
 
@@ -284,20 +423,25 @@ class Controller(ParameterTree):
         # respond to region clicks - do we click on a region's param?
         if not hasattr(item, 'param'):
             return None, None
-        isregion = item.param.name().startswith('define regions')
-        par = item.param
-        try:
-            if not isregion:
-                isregion = item.param.parent() is not None and item.param.parent().name().startswith('define regions')
-                par = item.param.parent()
-            if not isregion:
-                isregion = item.param.parent().parent() is not None \
-                            and item.param.parent().parent().name().startswith('define regions')
-                par = item.param.parent().parent()
-        except AttributeError:
-            pass
+        par = getattr(item.param, '_regionRoot', None)
+        return par is not None, par
 
-        return isregion, par
+    # ..................................................................................................................
+    def topGroup(self, param):
+
+        # parameters are normally tagged when created (see ProcessGroup.addNew)
+        top_group = getattr(param, '_topGroup', None)
+        if top_group is not None:
+            return top_group
+
+        top_group = param
+        top_parent = param.parent()
+        if top_parent is None:
+            return None
+        while top_parent.name() != 'params':
+            top_group = top_parent
+            top_parent = top_parent.parent()
+        return top_group
 
     # ..................................................................................................................
     def showRegions(self, visibility, item):
@@ -311,16 +455,23 @@ class Controller(ParameterTree):
                 except Exception as e:
                     scp.error_(e)
 
+    def onItemExpanded(self, item):
+        self.showRegions(True, item)
+
+    def onItemCollapsed(self, item):
+        self.showRegions(False, item)
+
     def selectRegion(self, item):
 
         isregion, par = self.isRegion(item)
         if isregion:
             if item.param.parent().name() == 'regiongroup':
-                kind = item.param.parent().parent().param('kind').value()
+                # par is the `define regions` parameter
+                kind = par.param('kind').value()
                 name = item.param.name()
                 # deselect all
-                p = item.param.parent().parent()
-                dim = self.dataset.dims[-1]
+                p = par
+                dim = self.dim
                 for regionItem in p.regions.getLinearRegions(kind, dim).values():
                     regionItem[0].setMouseHover(False)
                 regionItem = p.regions.findLinearRegion(name, kind, dim)
@@ -329,20 +480,37 @@ class Controller(ParameterTree):
 # ..................................................................................................................
     def change(self, params, changes):
 
-        dataset = self.dataset
+        if self.isProcessing or self.isInitializing or self.dataset is None:
+            return
 
-        if self.isProcessing or self.isInitializing or dataset is None:
+        changes = [item for item in changes if item[1] in self.processingChanges]
+        if not changes:
             return
 
-        state = params.saveState()
+        # A single user action often emits several tree changes: they are accumulated and applied together when the
+        # timer times out, so that the processing is executed only once.
+        self._pendingChanges.extend(changes)
+        self._changeTimer.start()
+
+    # ..................................................................................................................
+    def applyChanges(self):
+
+        changes, self._pendingChanges = self._pendingChanges, []
+        dataset = self.dataset
+        params = self.params
 
-        if dataset.state != state:
+        if not changes or dataset is None or params is None:
+            return
+
+        if any(change != 'contextMenu' for _, change, _ in changes):
+            # serialize the parameters tree only once: the resulting state is reused during processing
+            state = params.saveState()
+            if dataset.state == state:
+                return
             dataset.state = state
             self.parent.project.dirty = True
-            # variable
-        elif changes[0][1] != 'contextMenu':
-            return
 
+        process = False
         for param, change, data in changes:
 
             if change == 'parent' and data is None:
@@ -352,36 +520,36 @@ class Controller(ParameterTree):
 
             # Name of the parameter or group changed
             name = param.name()
-            scp.debug_(f'{name} changed `{changes}`')
+            scp.debug_(f'{name} changed `{change}`')
 
             # parents?
-            top_group = param
-            top_parent = param.parent()
-            if top_parent is None:
-                return
-            while top_parent.name() != 'params':
-                top_group = top_parent
-                top_parent = top_parent.parent()
+            top_group = self.topGroup(param)
+            if top_group is None:
+                continue
 
             # actions
             if top_group.name() == 'processing':
-                scp.debug_('processing changed -> execute actions')
-                self.processingChanged(dataset, params, param, change, data)
+                process = self.processingChanged(dataset, params, param, change, data) or process
 
-            return
+        if process:
+            scp.debug_('processing changed -> execute actions')
+            # dataset.state is up to date at this point (set above or in moveParameters)
+            dataset = self.performProcessing(dataset, params, state=dataset.state)
+            self.dataset = dataset
 
     # ..................................................................................................................
     def processingChanged(self, dataset, params, param, change, data):
+        # Return True if the processing must be executed
 
         name = param.name()
 
         if name=='processing' and change=='childAdded':
             # in principe there is no immediate change
-            return
+            return False
 
         if name=='kind' and change=='value' and data!='undefined':
             param.setOpts(readonly=True)
-            return
+            return False
 
         # if name=='output' and change=='value' and not data:
         #     return
@@ -393,9 +561,7 @@ class Controller(ParameterTree):
                 self.moveParameters(dataset, params, param, data)
                 params.blockSignals(False)
 
-        dataset = self.performProcessing(dataset, params)
-        self.dataset = dataset
-        return
+        return True
 
     # ..................................................................................................................
     def exportScript(self):
@@ -403,43 +569,30 @@ class Controller(ParameterTree):
         params = self.params
         actions = self.getProcessingActions(params)
 
-        script = ""
+        lines = []
 
         for action in actions:
             if action is None:
                 continue
 
-            cmdtxt = action[0].split('.')
+            # only the function name is needed here
+            func = action[0].split('.')[-1]
             kwargs = action[1]
 
-            if len(cmdtxt) > 1:
-                # call from a library or a script to import
-                lib = import_module(cmdtxt[0])
-                func = cmdtxt[1]
-
-            else:
-                lib = self
-                func = cmdtxt[0]
-
             if func == 'defineRegion':
-                script += f"{kwargs['kind']}_ranges = {kwargs['range']}\n"
+                lines.append(f"{kwargs['kind']}_ranges = {kwargs['range']}")
                 continue # next actions
 
             args = ''
             if func == 'basc':
                 args = '*baseline_ranges, '
 
-            kw = ""
-            for k,v in kwargs.items():
-                if isinstance(v, str):
-                    v = f"'{v}'"
-                kw += f"{k}={v}, "
-            if kw.endswith(", "):
-                kw = kw[:-2]
-            script += f"dataset.{func}({args}{kw})\n"
+            kw = ', '.join(f"{k}={v!r}" if isinstance(v, str) else f"{k}={v}" for k, v in kwargs.items())
+            lines.append(f"dataset.{func}({args}{kw})")
 
-        if not script:
+        if not lines:
             return
+        return '\n'.join(lines) + '\n'
 
 
     def importScript(self):
@@ -489,30 +642,43 @@ class Controller(ParameterTree):
     # ..................................................................................................................
     def moveParameters(self, dataset, params, param, data):
 
-        state = params.saveState()
-
-        proc = state['children']['processing']['children']
-        children = list(proc.keys())
-        index = i = children.index(param.name())
+        # Move the parameter in place: a full restoration of the parameters tree is not necessary
+        processing = params.param('processing')
+        index = processing.childs.index(param)
         if data == 'before' and index > 0:
-            children[i - 1], children[i] = children[i], children[i - 1]
-        elif data == 'after' and index < len(children) - 1:
-            children[i + 1], children[i] = children[i], children[i + 1]
-        new = type(proc)()
-        for k in children:
-            new[k] = proc[k]
-        state['children']['processing']['children'] = new
-        dataset.state = state
-        self.initialize(dataset)
+            index -= 1
+        elif data == 'after' and index < len(processing.childs) - 1:
+            index += 1
+        else:
+            return
+
+        # the signals of the moved parameter are blocked, so that it is not seen as removed (e.g., its regions must
+        # be kept)
+        param.blockSignals(True)
+        processing.insertChild(index, param)
+        param.blockSignals(False)
+
+        dataset.state = params.saveState()
 
     # ..................................................................................................................
-    def performProcessing(self, dataset, params):
+    def performProcessing(self, dataset, params, state=None):
 
         params.blockSignals(True)
 
         # Get the processing steps
-        dataset.state = params.saveState()  # save current parameters
-        actions = self.getProcessingActions(params)
+        if state is None:
+            state = params.saveState()
+        dataset.state = state  # save current parameters
+        actions = self.getProcessingActions(params, state)
+
+        # the processed data are still valid if nothing which affects the processing has changed, and if they have
+        # not been reset or replaced since (e.g., when saving or updating the dataset)
+        last = self._lastProcessing
+        if last is not None and last[0] is dataset and last[1] == actions and last[2] is dataset.processeddata \
+                and last[3] is dataset.processedmask and last[4] == dataset.transposed:
+            params.blockSignals(False)
+            return dataset
+        self._lastProcessing = None
 
         # Reset dataset to original
         dataset.processeddata = None
@@ -532,15 +698,26 @@ class Controller(ParameterTree):
             if hasattr(self.parent, 'plotwidget'):
                 self.parent.plotwidget.sigZoomReset.emit()
 
+        if dataset is not None:
+            self._lastProcessing = (dataset, actions, dataset.processeddata, dataset.processedmask,
+                                    dataset.transposed)
         params.blockSignals(False)
         return dataset
 
     # ..................................................................................................................
-    def getProcessingActions(self, params):
+    def getProcessingActions(self, params, state=None):
 
         # Brute force method: if any of the processing parameters change, we reevaluate all processing step (will
         # be refined later)
 
+        # The actions depend only on the parameters state: if it is given and unchanged, reuse the previous actions.
+        # (keys must not be sorted, as the order of the processing steps matters)
+        key = None
+        if state is not None:
+            key = json.dumps(state, default=str)
+            if self._actionsCache is not None and self._actionsCache[0] == key:
+                return self._actionsCache[1]
+
         proc = params.param('processing')
         actions = []
 
@@ -558,14 +735,15 @@ class Controller(ParameterTree):
                         parameters[children.name()] = children.value()
             else:
                 parameters['kind'] = item.param('kind').value()
-                parameters['range'] = [list(eval(val.value().split('> ')[1]))
-                                       for val in item.param('regiongroup').children()]
+                parameters['range'] = item.param('regiongroup').spans.tolist()
 
             actions[-1].append(parameters)
 
         scp.debug_('ACTIONS: ')
         scp.debug_(actions)
 
+        if key is not None:
+            self._actionsCache = (key, actions)
         return actions
 
     # ..................................................................................................................
@@ -574,8 +752,8 @@ class Controller(ParameterTree):
             # Only output, but set to None
             return
 
-        # input
-        new = dataset.copy()
+        # input: it is copied before the first action (see below)
+        new = dataset
 
         # apply actions
         nprocess = 0
@@ -585,16 +763,11 @@ class Controller(ParameterTree):
 
             nprocess += 1
             scp.debug_(f'Action running: {action}')
-            cmdtxt = action[0].split('.')
-
-            if len(cmdtxt) > 1:
-                # call from a library or a script to import
-                lib = import_module(cmdtxt[0])
-                f = cmdtxt[1]
-            else:
-                lib = self
-                f = cmdtxt[0]
-            func = getattr(lib, f)
+            if new is dataset:
+                # the actions (controller methods, e.g. setMask, or library functions) may modify their input in
+                # place: the original dataset is copied before the first one (and only if there is one)
+                new = dataset.copy()
+            func = self.actionFunction(action[0])
             kwargs = action[1]
             new = func(new, **kwargs)
 
@@ -610,6 +783,17 @@ class Controller(ParameterTree):
 
         return dataset
 
+    # ..................................................................................................................
+    def actionFunction(self, action):
+        # Return the function executing an action, e.g.,  `spectrochempy.abc` (from a library) or `defineRegion` (a
+        # controller method). Functions are resolved only once.
+        func = self._actionFunctions.get(action)
+        if func is None:
+            cmdtxt = action.split('.')
+            lib = import_module(cmdtxt[0]) if len(cmdtxt) > 1 else self
+            func = self._actionFunctions[action] = getattr(lib, cmdtxt[-1])
+        return func
+
     # ..................................................................................................................
     def processingOutput(self, dataset, name):
         """
@@ -701,9 +885,24 @@ class Controller(ParameterTree):
     # ..................................................................................................................
     def setMask(self, dataset, ranges):
 
-        for span in ranges:
-            low, up = span
-            dataset[:, low:up] = scp.MASKED
+        x = getattr(dataset, dataset.dims[-1])
+        if x is not None and x.implements('CoordSet'):
+            # if several coords, take the default ones:
+            x = x.default
+        if x is None or x.data is None:
+            # no coordinates data: use location slicing
+            for span in ranges:
+                low, up = span
+                dataset[:, low:up] = scp.MASKED
+            return dataset
+
+        # build the columns mask for all ranges, then apply it in a single operation
+        colmask = rangesMask(x.data, ranges)
+
+        if colmask.any():
+            mask = np.zeros(dataset.shape, dtype=bool)
+            mask[..., colmask] = True
+            dataset.mask = dataset.mask | mask
         return dataset
 
     # ..................................................................................................................
@@ -728,9 +927,15 @@ class Controller(ParameterTree):
     # ..................................................................................................................
     def initialize(self, dataset):
 
+        # pending changes (if any) concern the previous state of the parameters
+        self._changeTimer.stop()
+        self._pendingChanges = []
+
         if dataset is None:
             self._dataset = None
+            self._dim = None
             self._params = None
+            self._lastProcessing = None
             return
 
         scp.debug_('initialize controller')
@@ -755,6 +960,9 @@ class Controller(ParameterTree):
             params._parent = self
             self.setParameters(params, showTop=False)
 
+            # connects events (only once per params tree, or change would be executed several times per event)
+            params.sigTreeStateChanged.connect(self.change)
+
         if dataset.state:
             scp.debug_('Restore state')
             # was already saved before. Restore it
@@ -762,7 +970,6 @@ class Controller(ParameterTree):
 
         # actualise
         scp.debug_('Save state')
-        dataset.state = params.saveState()
         dataset = self.performProcessing(dataset, params)
         for item in params.param('processing'):
             item.opts['expanded'] = False
@@ -770,9 +977,7 @@ class Controller(ParameterTree):
 
         # set the current dataset
         self._dataset = dataset
-
-        # connects events
-        self._params.sigTreeStateChanged.connect(self.change)
+        self._dim = dataset.dims[-1]
 
         self.isInitializing = False
         scp.debug_('Initialisation finished')
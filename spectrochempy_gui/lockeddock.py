@@ -13,6 +13,12 @@ from spectrochempy_gui.pyqtgraph.dockarea import DockArea, Dock
 
 __all__ = ['LockedDockArea', 'LockedDock']
 
+
+# ......................................................................................................................
+def _noop(self, ev):
+    pass
+
+
 # ======================================================================================================================
 class LockedDock(Dock):
 
@@ -34,41 +40,13 @@ class LockedDock(Dock):
         self.setMinimumSize(300,50)
 
     # ..................................................................................................................
-    def dragEventEnter(self, ev):
-        pass
-
-    # ..................................................................................................................
-    def dragMoveEvent(self, ev):
-        pass
-
-    # ..................................................................................................................
-    def dragLeaveEvent(self, ev):
-        pass
-
-    # ..................................................................................................................
-    def dragDropEvent(self, ev):
-        pass
-
-    # ..................................................................................................................
-    def noopEvent(self,ev):
-        pass
+    # Drag events and label double click are ignored
+    dragEventEnter = dragMoveEvent = dragLeaveEvent = dragDropEvent = noopEvent = _noop
 
 
 # ======================================================================================================================
 class LockedDockArea(DockArea):
 
     # ..................................................................................................................
-    def dragEventEnter(self, ev):
-        pass
-
-    # ..................................................................................................................
-    def dragMoveEvent(self, ev):
-        pass
-
-    # ..................................................................................................................
-    def dragLeaveEvent(self, ev):
-        pass
-
-    # ..................................................................................................................
-    def dragDropEvent(self, ev):
-        pass
+    # Drag events are ignored
+    dragEventEnter = dragMoveEvent = dragLeaveEvent = dragDropEvent = _noop
@@ -13,23 +13,25 @@ import logging
 from spectrochempy_gui.pyqtgraph.Qt import QtCore
 import spectrochempy as scp
 
+LEVEL_COLORS = {logging.ERROR: '#EE0000', logging.WARNING: '#880000'}
+
 
 class QtHandler(logging.Handler):
     def __init__(self):
         logging.Handler.__init__(self)
+        self._stream = ConsoleStream.stdout()
 
     def emit(self, record):
-        record = self.format(record)
-        if record:
-            msg = '%s' % record
-            color = '#000088'
-            if 'ERROR |' in msg:
-                color = '#EE0000'
-            elif 'WARNING |' in msg:
-                color = '#880000'
+        if record.levelno < self.level:
+            # not displayed: avoid formatting
+            return
+        text = self.format(record)
+        if text:
+            msg = '%s' % text
+            color = LEVEL_COLORS.get(record.levelno, '#000088')
             # msg = "<font color={}>{}</font><br>".format(color, msg)  # problem with the Dark mode on Mac
             msg = f"{msg}<br>"
-            ConsoleStream.stdout().write(msg)
+            self._stream.write(msg)
 
 
 class ConsoleStream(QtCore.QObject):
@@ -45,21 +47,21 @@ class ConsoleStream(QtCore.QObject):
         return -1
 
     def write(self, msg, html=True):
-        if (not self.signalsBlocked()):
-            self.messageWritten.emit(msg, html)
+        # whitespace only messages (e.g., the newline written by print) have no effect in html
+        if not msg or msg.isspace() or self.signalsBlocked():
+            return
+        self.messageWritten.emit(msg, html)
 
     @staticmethod
     def stdout():
         if (not ConsoleStream._stdout):
             ConsoleStream._stdout = ConsoleStream()
-            sys.stdout = ConsoleStream._stdout
         return ConsoleStream._stdout
 
     @staticmethod
     def stderr():
         if (not ConsoleStream._stderr):
             ConsoleStream._stderr = ConsoleStream()
-            sys.stderr = ConsoleStream._stderr
         return ConsoleStream._stderr
 
 def redirectoutput(console=None):
@@ -68,5 +70,8 @@ def redirectoutput(console=None):
         scp.logs.error_("A console is needed for redirecting output")
         return
 
-    ConsoleStream.stdout().messageWritten.connect(console.write)
-    ConsoleStream.stderr().messageWritten.connect(console.write)
+    # messages may be written from other threads: always deliver them through the event loop of the GUI thread
+    ConsoleStream.stdout().messageWritten.connect(console.write, QtCore.Qt.QueuedConnection)
+    ConsoleStream.stderr().messageWritten.connect(console.write, QtCore.Qt.QueuedConnection)
+    sys.stdout = ConsoleStream.stdout()
+    sys.stderr = ConsoleStream.stderr()
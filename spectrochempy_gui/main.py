@@ -17,9 +17,11 @@ def start():
 
     # Main thread
     from spectrochempy_gui.pyqtgraph.Qt import QtGui
-    from spectrochempy_gui.mainwindow import MainWindow
 
     gui = QtGui.QApplication(sys.argv)
+
+    # the main window imports spectrochempy (slow): do it once the application exists
+    from spectrochempy_gui.mainwindow import MainWindow
     mw = MainWindow(show=True)
     gui.exec_()
 
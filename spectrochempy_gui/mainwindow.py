@@ -10,23 +10,22 @@ import logging
 import time
 
 from functools import partial
-from setuptools_scm import get_version
 
 import spectrochempy as scp
 
 import spectrochempy_gui.pyqtgraph as pg
-from spectrochempy_gui.pyqtgraph.Qt import QtGui, QtCore, QtWidgets
+from spectrochempy_gui.pyqtgraph.Qt import QtGui, QtCore
 from spectrochempy_gui.projecttree import ProjectTreeWidget
-from spectrochempy_gui.plots import PlotWidget
 from spectrochempy_gui.controller import Controller
-from spectrochempy_gui.preferences import Preferences, GeneralPreferencesWidget
-from spectrochempy_gui.utils import geticon
+from spectrochempy_gui.utils import qicon, preloadIcons
 from spectrochempy_gui.lockeddock import LockedDock, LockedDockArea
 from spectrochempy_gui.model import Project
 # from spectrochempy_gui.widgets.progresswidget import QProgressIndicator
 
 scp.core.FileDialog = QtGui.QFileDialog
 
+pg.setConfigOptions(background='w', foreground='k')
+
 # TODO: set this to False for production
 __DEV__ = True
 
@@ -34,17 +33,18 @@ __DEV__ = True
 # ======================================================================================================================
 class MainWindow(QtGui.QMainWindow):
 
+    # additional preference pages (the general preferences page is always present)
     preference_pages = []
 
+    _version = None
+    _aboutText = None
+
     # ..................................................................................................................
     def __init__(self, show=True):
 
         super().__init__()
 
-        pg.setConfigOption('background', 'w')
-        pg.setConfigOption('foreground', 'k')
-
-        siz = QtWidgets.QDesktopWidget().screenGeometry(-1)
+        siz = QtGui.QGuiApplication.primaryScreen().availableGeometry()
         self.ww, self.wh = ww, wh = min(1500, siz.width() * .80), min(900, siz.height() * .80)
         self.move(QtCore.QPoint(10, 10))  # TODO: center it ?
 
@@ -65,7 +65,8 @@ class MainWindow(QtGui.QMainWindow):
 
         self.area = area = LockedDockArea()
         self.setCentralWidget(area)
-        self.setWindowIcon(QtGui.QIcon(str(geticon('scpy.png'))))
+        preloadIcons()
+        self.setWindowIcon(qicon('scpy.png'))
         self.setWindowTitle('SpectroChemPy GUI')
 
         # --------------------------------------------------------------------------------------------------------------
@@ -117,140 +118,64 @@ class MainWindow(QtGui.QMainWindow):
         # Create Menubar and actions
         # --------------------------------------------------------------------------------------------------------------
 
-        # MENU FILE
-        # -------------------------------------------------------------------
-
-        project_menu = QtGui.QMenu('&Project', parent=self)
-        self.menuBar().addMenu(project_menu)
+        # Each menu is defined by a list of actions: (attribute name or None, text, shortcut, status tip, slot,
+        # disabled). None adds a separator.
+        KeySequence = QtGui.QKeySequence
 
         # Project menu
         # ----------------------------------------------------------------------------------------------------------
 
-        self.new_action = QtGui.QAction('&New project', self)
-        self.new_action.setShortcut(QtGui.QKeySequence.New)
-        self.new_action.setStatusTip('Create a new main project')
-        self.new_action.triggered.connect(partial(self.project.openProject, new=True))
-        project_menu.addAction(self.new_action)
-
-        self.open_action = QtGui.QAction('&Open project', self)
-        self.open_action.setShortcut(QtGui.QKeySequence.Open)
-        self.open_action.setStatusTip('Open a new main project')
-        self.open_action.triggered.connect(partial(self.project.openProject, new=False))
-        project_menu.addAction(self.open_action)
-
-        # Dataset menu
-        # --------------------------------------------------------------------------------------------------------------
-
-        project_menu.addSeparator()
-
-        self.add_dataset_action = QtGui.QAction('Add dataset', self)
-        self.add_dataset_action.triggered.connect(self.project.addDataset)
-        self.add_dataset_action.setShortcut(QtGui.QKeySequence('Ctrl+A', QtGui.QKeySequence.NativeText))
-        self.add_dataset_action.setDisabled(True)
-        project_menu.addAction(self.add_dataset_action)
-
-        self.remove_dataset_action = QtGui.QAction('remove selected dataset', self)
-        self.remove_dataset_action.triggered.connect(self.project.removeDataset)
-        self.remove_dataset_action.setShortcut(QtGui.QKeySequence('Ctrl+D', QtGui.QKeySequence.NativeText))
-        self.remove_dataset_action.setDisabled(True)
-        project_menu.addAction(self.remove_dataset_action)
-
-        # Save project menu
-        # ----------------------------------------------------------------------------------------------------------
-
-        project_menu.addSeparator()
-
-        self.save_action = QtGui.QAction('&Save project', self)
-        self.save_action.setStatusTip('Save the entire project into a file')
-        self.save_action.setShortcut(QtGui.QKeySequence.Save)
-        self.save_action.triggered.connect(partial(self.project.saveProject, force=True))
-        self.save_action.setDisabled(True)
-        project_menu.addAction(self.save_action)
-
-        self.save_as_action = QtGui.QAction('Save project as...', self)
-        self.save_as_action.setStatusTip('Save the entire project into a new file')
-        self.save_as_action.setShortcut(QtGui.QKeySequence.SaveAs)
-        self.save_as_action.triggered.connect(partial(self.project.saveProject, force=True, saveas=True))
-        self.save_as_action.setDisabled(True)
-        project_menu.addAction(self.save_as_action)
-
-        # Close project menu
-        # ----------------------------------------------------------------------------------------------------------
-
-        project_menu.addSeparator()
-
-        self.close_action = QtGui.QAction('Close project', self)
-        self.close_action.setShortcut(QtGui.QKeySequence('Ctrl+Shift+W', QtGui.QKeySequence.NativeText))
-        self.close_action.setStatusTip('Close the main project and delete all data and plots out of '
-                                          'memory')
-        self.close_action.triggered.connect(self.project.closeProject)
-        self.close_action.setDisabled(True)
-        project_menu.addAction(self.close_action)
-
-        # Quit
-        # --------------------------------------------------------------------------------------------------------------
-
+        project_actions = [
+            ('new_action', '&New project', KeySequence.New, 'Create a new main project',
+             partial(self.project.openProject, new=True), False),
+            ('open_action', '&Open project', KeySequence.Open, 'Open a new main project',
+             partial(self.project.openProject, new=False), False),
+            None,
+            ('add_dataset_action', 'Add dataset', KeySequence('Ctrl+A', KeySequence.NativeText), None,
+             self.project.addDataset, True),
+            ('remove_dataset_action', 'remove selected dataset', KeySequence('Ctrl+D', KeySequence.NativeText), None,
+             self.project.removeDataset, True),
+            None,
+            ('save_action', '&Save project', KeySequence.Save, 'Save the entire project into a file',
+             partial(self.project.saveProject, force=True), True),
+            ('save_as_action', 'Save project as...', KeySequence.SaveAs, 'Save the entire project into a new file',
+             partial(self.project.saveProject, force=True, saveas=True), True),
+            None,
+            ('close_action', 'Close project', KeySequence('Ctrl+Shift+W', KeySequence.NativeText),
+             'Close the main project and delete all data and plots out of memory', self.project.closeProject, True),
+        ]
         if sys.platform != 'darwin':  # mac os makes this anyway
-            quit_action = QtGui.QAction('Quit', self)
-            quit_action.triggered.connect(QtCore.QCoreApplication.instance().quit)
-            quit_action.setShortcut(QtGui.QKeySequence.Quit)
-            project_menu.addAction(quit_action)
-
-        self.menuBar().addMenu(project_menu)
+            project_actions.append(
+                (None, 'Quit', KeySequence.Quit, None, QtCore.QCoreApplication.instance().quit, False))
 
         # Processing menu
-        # ---------------
-        proc_menu = QtGui.QMenu('Script', parent=self)
-        self.menuBar().addMenu(proc_menu)
-
-        # export script
-        export_script_action = QtGui.QAction('Export script', self)
-        export_script_action.triggered.connect(self.controller.exportScript)
-        proc_menu.addAction(export_script_action)
+        # ----------------------------------------------------------------------------------------------------------
 
-        # import script
-        import_script_action = QtGui.QAction('Import script', self)
-        import_script_action.triggered.connect(self.controller.importScript)
-        proc_menu.addAction(import_script_action)
+        script_actions = [
+            (None, 'Export script', None, None, self.controller.exportScript, False),
+            (None, 'Import script', None, None, self.controller.importScript, False),
+        ]
 
         # Help menu
-        # --------------------------------------------------------------------------------------------------------------
-
-        help_menu = QtGui.QMenu('Help', parent=self)
-        self.menuBar().addMenu(help_menu)
-
-        # About
-
-        about_action = QtGui.QAction('About', self)
-        about_action.triggered.connect(self.onAbout)
-        help_menu.addAction(about_action)
-
-        # Preferences
-
-        prefs_action = QtGui.QAction('Preferences', self)
-        prefs_action.triggered.connect(lambda: self.onEditPreferences(True))
-        prefs_action.setShortcut(QtGui.QKeySequence.Preferences)
-        help_menu.addAction(prefs_action)
-
-        # Documentation
-
-        doc_action = QtGui.QAction('Documentationt', self)
-        doc_action.triggered.connect(self.onDoc)
-        help_menu.addAction(doc_action)
+        # ----------------------------------------------------------------------------------------------------------
 
-        # Console
+        help_actions = [
+            (None, 'About', None, None, self.onAbout, False),
+            (None, 'Preferences', KeySequence.Preferences, None, self.onEditPreferences, False),
+            (None, 'Documentationt', None, None, self.onDoc, False),
+            # (None, 'Console', None, None, self.show_console, False),
+        ]
 
-        # console_action = QtGui.QAction('Console', self)
-        # console_action.triggered.connect(self.show_console)
-        # help_menu.addAction(console_action)
+        for title, actions in [('&Project', project_actions), ('Script', script_actions), ('Help', help_actions)]:
+            menu = QtGui.QMenu(title, parent=self)
+            self.menuBar().addMenu(menu)
+            self.addMenuActions(menu, actions)
 
         if sys.platform == 'darwin':
             self.menuBar().setNativeMenuBar(
                 False)  # this put the menu in the  #  window itself in OSX, as in windows.  # TODO: set this in
             # preferences
 
-        self.preference_pages.extend([GeneralPreferencesWidget, ])
-
         # --------------------------------------------------------------------------------------------------------------
         # Signal connections
         # --------------------------------------------------------------------------------------------------------------
@@ -272,11 +197,31 @@ class MainWindow(QtGui.QMainWindow):
             self.show()
             self.controller.onProjectChanged('opened')
 
+    # ..................................................................................................................
+    def addMenuActions(self, menu, actions):
+
+        for spec in actions:
+            if spec is None:
+                menu.addSeparator()
+                continue
+            name, text, shortcut, tip, slot, disabled = spec
+            action = QtGui.QAction(text, self)
+            if shortcut is not None:
+                action.setShortcut(shortcut)
+            if tip is not None:
+                action.setStatusTip(tip)
+            action.triggered.connect(slot)
+            action.setDisabled(disabled)
+            menu.addAction(action)
+            if name is not None:
+                setattr(self, name, action)
+
     # ..................................................................................................................
     def setupPlot(self, title=None):
 
         # Create the plotwidget, if it doesn't exist yet.
         if not hasattr(self, 'plotwidget'):
+            from spectrochempy_gui.plots import PlotWidget  # imported when needed (slow import of matplotlib)
             self.plotwidget = plotwidget = PlotWidget(parent=self)
             self.dplot.addWidget(plotwidget)
 
@@ -291,13 +236,27 @@ class MainWindow(QtGui.QMainWindow):
         """
         Returns current version of the GUI application.
         """
-        return get_version(root='..', relative_to=__file__)
+        if MainWindow._version is None:
+            # determined only once: get_version queries git
+            try:
+                from setuptools_scm import get_version
+                MainWindow._version = get_version(root='..', relative_to=__file__)
+            except (ImportError, LookupError):
+                # not in a git repository (installed package)
+                try:
+                    from importlib.metadata import version
+                    MainWindow._version = version('spectrochempy_gui')
+                except ImportError:
+                    # python < 3.8 (PackageNotFoundError is also an ImportError)
+                    MainWindow._version = 'unknown'
+        return MainWindow._version
 
     # ..................................................................................................................
     def onAbout(self):
 
-        about = QtGui.QMessageBox.about(self, "About SpectroChemPy",
-        f""" 
+        if self._aboutText is None:
+            # built once (the versions do not change during the session)
+            self._aboutText = f"""
         <center>
         <strong> SpectroChemPy GUI Info </strong><br/>
         <strong>GUI Version:</strong> {self.getVersion()}<br>
@@ -307,7 +266,7 @@ class MainWindow(QtGui.QMainWindow):
         <br/>
 
         <p><strong>SpectroChemPy</strong> is a framework for processing, analysing and modelling
-         <strong>Spectro</>scopic data for <strong>Chem</strong>istry with <strong>Py</strong>thon.
+         <strong>Spectro</strong>scopic data for <strong>Chem</strong>istry with <strong>Py</strong>thon.
          It is a cross platform software, running on Linux, Windows or OS X.</p><br><br>
         
         <div class='warning'> SpectroChemPy is still experimental and under active development. Its current design and
@@ -322,25 +281,22 @@ class MainWindow(QtGui.QMainWindow):
 
         </center>
 
-        """)  # % versions)
+        """
+        QtGui.QMessageBox.about(self, "About SpectroChemPy", self._aboutText)
 
     # ..................................................................................................................
     def onEditPreferences(self):
 
-        if hasattr(self, 'preferences'):
-            try:
-                self.preferences.close()
-            except RuntimeError:
-                pass
-        self.preferences = dlg = Preferences(self)
-
-        for Page in self.preference_pages:
-            page = Page(dlg)
-            page.initialize()
-            dlg.add_page(page)
-
-        if exec_:
-            dlg.exec_()
+        dlg = getattr(self, 'preferences', None)
+        if dlg is None:
+            # the dialog and its pages are built once, then only refreshed when they are shown
+            from spectrochempy_gui.preferences import Preferences, GeneralPreferencesWidget
+            self.preferences = dlg = Preferences(self)
+            for Page in [GeneralPreferencesWidget] + self.preference_pages:
+                dlg.add_page(Page(dlg))
+
+        dlg.invalidate_pages()
+        dlg.exec_()
 
     def onDoc(self):
 
@@ -9,7 +9,10 @@
 Model module.
 
 """
-from functools import partial
+from ast import literal_eval
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import partial, lru_cache
 from pathlib import Path
 
 import spectrochempy as scp
@@ -18,6 +21,69 @@ from spectrochempy_gui import pyqtgraph as pg
 from spectrochempy_gui.pyqtgraph.Qt import QtGui, QtCore
 from spectrochempy_gui.utils import confirm_msg
 
+# ----------------------------------------------------------------------------------------------------------------------
+@lru_cache(maxsize=256)
+def parseSpan(value):
+    """
+    Parse a region parameter value such as `x> 1.0, 2.0` and return the dimension and the span.
+
+    """
+    dim, span = value.split('> ')
+    return dim, literal_eval(span)
+
+# ----------------------------------------------------------------------------------------------------------------------
+@contextmanager
+def originalDataOnly(project):
+    """
+    Temporarily reduce a project to its original datasets, without processed data, for saving.
+
+    The project is modified in place (instead of saving a copy of it) and restored on exit: no event must be
+    processed meanwhile (e.g., no dialog must be opened).
+    """
+    subprojects = []
+    originals = []
+    for name in project.projects_names:
+        subproj = project[name]
+        datasets = subproj._datasets
+        subprojects.append((subproj, datasets))
+        subproj._datasets = type(datasets)((k, v) for k, v in datasets.items() if 'original' in k)
+        for dataset in subproj._datasets.values():
+            originals.append((dataset, dataset.processeddata, dataset.processedmask, dataset.transposed))
+            dataset.processeddata = None
+            dataset.processedmask = False
+            if dataset.transposed:
+                dataset.transpose(inplace=True)
+    try:
+        yield project
+    finally:
+        for dataset, processeddata, processedmask, transposed in originals:
+            if transposed:
+                dataset.transpose(inplace=True)
+            dataset.processeddata = processeddata
+            dataset.processedmask = processedmask
+        for subproj, datasets in subprojects:
+            subproj._datasets = datasets
+
+# ----------------------------------------------------------------------------------------------------------------------
+def originalDataCopy(project):
+    """
+    Return a copy of a project reduced to its original datasets, without processed data, for saving.
+
+    Used when the project must not be modified during the saving (e.g., when a file dialog is opened).
+    """
+    proj = project.copy()
+    for name in proj.projects_names:
+        for datasetname in proj[name].datasets_names:
+            if 'original' not in datasetname:
+                proj[name].remove_dataset(datasetname)
+            else:
+                proj[name][datasetname].processeddata = None
+                proj[name][datasetname].processedmask = False
+                # we take the flag on the project as it is not copied
+                if project[name][datasetname].transposed:
+                    proj[name][datasetname].transpose(inplace=True)
+    return proj
+
 # ----------------------------------------------------------------------------------------------------------------------
 class Project(QtCore.QObject):
     """
@@ -41,16 +107,24 @@ class Project(QtCore.QObject):
 
     _dirty = False
 
+    # nesting level of the batch context and project changes waiting for its exit
+    _batchDepth = 0
+    _pendingChanges = None
+
     _directory = scp.preferences.project_directory
 
+    # minimum autosave delay (ms)
+    AUTOSAVE_INTERVAL = 30000
+
     # ..................................................................................................................
     def __init__(self, parent):
         QtCore.QObject.__init__(self)
         self._parent = parent
 
-        # Autosave feature
+        # Autosave feature: the project is saved 30s (or more for large projects) after it becomes dirty
         self.autosaveTimer = QtCore.QTimer()
-        self.autosaveTimer.setInterval(30000)
+        self.autosaveTimer.setSingleShot(True)
+        self.autosaveTimer.setInterval(self.AUTOSAVE_INTERVAL)
         self.autosaveTimer.timeout.connect(self.saveProject)
 
         # Open last_project
@@ -84,14 +158,8 @@ class Project(QtCore.QObject):
         #self.parent.statusbar.showMessage("Setting a project ... ")
         scp.preferences.last_project = fname
         proj = self._loadProject(fname)
-        if proj is not None:
-            if not proj.directory:
-                proj._directory = self._directory
-        self._project = proj
-        if scp.preferences.autosave_project:
-            self.autosaveTimer.start()
-        self.dirty = True
-        self.sigProjectChanged.emit('opened')
+        # a new empty project has nothing to save
+        self._setProject(proj, dirty=fname not in [None, '', 'untitled'])
         #self.parent.statusbar.showMessage("")
 
     @property
@@ -108,9 +176,47 @@ class Project(QtCore.QObject):
 
     @dirty.setter
     def dirty(self, dirty):
+        if dirty == self._dirty:
+            return
         self._dirty = dirty
+        if not dirty:
+            self.autosaveTimer.stop()
+        elif scp.preferences.autosave_project:
+            self.autosaveTimer.start()
         self.sigSetDirty.emit()
 
+    # ------------------------------------------------------------------------------------------------------------------
+    # Signals
+    # ------------------------------------------------------------------------------------------------------------------
+
+    # ..................................................................................................................
+    @contextmanager
+    def batch(self):
+        """
+        Context manager grouping several project changes into a single sigProjectChanged emission.
+
+        When all the changes are of the same kind (or when the project is finally closed), this change is emitted,
+        otherwise the change is 'bulk'.
+        """
+        if not self._batchDepth:
+            self._pendingChanges = []
+        self._batchDepth += 1
+        try:
+            yield self
+        finally:
+            self._batchDepth -= 1
+            if not self._batchDepth and self._pendingChanges:
+                changes, self._pendingChanges = self._pendingChanges, None
+                change = changes[-1] if len(set(changes)) == 1 or changes[-1] == 'closed' else 'bulk'
+                self.sigProjectChanged.emit(change)
+
+    # ..................................................................................................................
+    def emitProjectChanged(self, change):
+        if self._batchDepth:
+            self._pendingChanges.append(change)
+        else:
+            self.sigProjectChanged.emit(change)
+
     # ------------------------------------------------------------------------------------------------------------------
     # Project
     # ------------------------------------------------------------------------------------------------------------------
@@ -134,20 +240,23 @@ class Project(QtCore.QObject):
             if not fname:
                 return
         else:
-            # New project
-            fname = None
+            # New project: created directly in memory
+            scp.preferences.last_project = None
+            self._setProject(scp.Project(name='untitled'), dirty=False)
+            return
         self.project = fname
 
     # ..................................................................................................................
     def closeProject(self):
-        # Save current project
-        self.saveProject()
-        self.project = None
-        self.dataset = None
-        # Stop autosave
-        self.autosaveTimer.stop()
-        # Signal
-        self.sigProjectChanged.emit('closed')
+        with self.batch():
+            # Save current project
+            self.saveProject()
+            self.project = None
+            self.dataset = None
+            # Stop autosave
+            self.autosaveTimer.stop()
+            # Signal
+            self.emitProjectChanged('closed')
 
     # ..................................................................................................................
     def saveProject(self, *args, **kwargs):
@@ -155,27 +264,26 @@ class Project(QtCore.QObject):
             if not self.dirty:
                 return
         scp.debug_('Saving project')
-        # we need to save only the original data as they will be recalculaded anyway when reloaded
-        proj = self.project.copy()
-        for name in proj.projects_names:
-            for datasetname in proj[name].datasets_names:
-                if 'original' not in datasetname:
-                    proj[name].remove_dataset(datasetname)
-                else:
-                    proj[name][datasetname].processeddata = None
-                    proj[name][datasetname].processedmask = False
-                    transposed = self.project[name][datasetname].transposed # we take the flag on the self.project
-                    # has it is not copied
-                    if transposed:
-                        proj[name][datasetname].transpose(inplace=True)
-
+        proj = self.project
         if proj.directory is None:
             proj._directory = self._directory
+        # we need to save only the original data as they will be recalculaded anyway when reloaded
         if kwargs.get('saveas') or proj.name == 'untitled':
+            # the file dialog runs an event loop (timers, repaints, ...) during which the current project must stay
+            # complete: a reduced copy is saved
+            proj = originalDataCopy(proj)
             proj.save_as(self._directory / 'untitled.pscp', Qt_parent=self.parent)
-            self.sigProjectChanged.emit('renamed')
+            renamed = True
         else:
-            proj.save()
+            with originalDataOnly(proj):
+                elapsed = QtCore.QElapsedTimer()
+                elapsed.start()
+                proj.save()
+                # for large projects, autosave less often so that saving takes at most ~10% of the time
+                self.autosaveTimer.setInterval(max(self.AUTOSAVE_INTERVAL, 10 * elapsed.elapsed()))
+            renamed = False
+        if renamed:
+            self.emitProjectChanged('renamed')
         scp.preferences.last_project = Path(proj.directory) / proj.name
         self.dirty = False
 
@@ -195,6 +303,13 @@ class Project(QtCore.QObject):
         except Exception as e:
             scp.error_(e)
 
+        if isinstance(dataset, (list, tuple)):
+            # several datasets: the project tree is updated only once
+            with self.batch():
+                for item in dataset:
+                    self.addDataset(item)
+            return
+
         # Create a subproject with this dataset
         subproj = scp.Project()
         self.project.add_project(subproj, dataset.name)
@@ -202,7 +317,7 @@ class Project(QtCore.QObject):
 
         # Signal
         self.dirty = True
-        self.sigProjectChanged.emit('dataset added')
+        self.emitProjectChanged('dataset added')
 
     # ..................................................................................................................
     def removeDataset(self, name=None):
@@ -230,25 +345,27 @@ class Project(QtCore.QObject):
         self.dataset = None
         self.dirty = True
         # Signal
-        self.sigProjectChanged.emit('dataset removed')
+        self.emitProjectChanged('dataset removed')
 
     # ..................................................................................................................
     def updateDataset(self, dataset):
-        if 'untitled' not in dataset.name:
+        name = dataset.name
+        if 'untitled' not in name:
             # the parent subproject should be specified
-            subproj = dataset.name.split('/')[0]
-            if dataset.name in self.project[subproj].datasets_names:
+            subproj = self.project[name.split('/')[0]]
+            datasets = subproj._datasets
+            previous = datasets.get(name)
+            if previous is not None:
                 # In this case just update : but warning the dataset id must be the same the previous one.
-                scp.debug_(f'Update dataset: {dataset.name}')
-                id = self.project[subproj]._datasets[dataset.name].id
-                dataset._id = id
-                self.project[subproj]._datasets[dataset.name] = dataset
-                if self.dataset.name == dataset.name:
+                scp.debug_(f'Update dataset: {name}')
+                dataset._id = previous.id
+                datasets[name] = dataset
+                if self.dataset.name == name:
                     self.sigDatasetChanged.emit(dataset, 'updated')
             else:
-                scp.debug_(f'Add dataset {dataset.name} to project')
-                self.project[subproj].add_dataset(dataset)
-                self.sigProjectChanged.emit('dataset added')
+                scp.debug_(f'Add dataset {name} to project')
+                subproj.add_dataset(dataset)
+                self.emitProjectChanged('dataset added')
                 #self.sigDatasetChanged.emit(dataset, 'added')
             self.dirty = True
 
@@ -264,6 +381,15 @@ class Project(QtCore.QObject):
     # Private methods
     # ------------------------------------------------------------------------------------------------------------------
 
+    # ..................................................................................................................
+    def _setProject(self, proj, dirty=True):
+
+        if proj is not None and not proj.directory:
+            proj._directory = self._directory
+        self._project = proj
+        self.dirty = dirty
+        self.emitProjectChanged('opened')
+
     # ..................................................................................................................
     def _loadProject(self, *args, **kwargs):
         """
@@ -292,7 +418,6 @@ class Regions(QtCore.QObject):
     Class defining a set of regions on the plot
     """
     kind = 'undefined'
-    regionItems = {}
 
     sigRegionAdded = QtCore.Signal(object, object)
     sigRegionRemoved = QtCore.Signal(object, object)
@@ -301,13 +426,29 @@ class Regions(QtCore.QObject):
     # constant
     BRUSH = {'mask': (200, 200, 200, 60), 'baseline': (0, 200, 0, 60), 'integral': (0, 0, 200, 60), }
 
+    # QBrush built from the colors above (created once per color)
+    _qbrushes = {}
+
     # ..................................................................................................................
     def __init__(self, kind='undefined'):
 
         QtCore.QObject.__init__(self)
 
+        # the regions of this object only: (LinearRegionItem, param) by name, and the same items grouped by (dim, kind)
+        self.regionItems = {}
+        self._byKind = defaultdict(dict)
         self.kind = kind
-        self.brushcolor = self.BRUSH.get(kind.lower(), (254, 0, 0, 60))
+        self.brushcolor = self.brush(kind)
+
+    # ..................................................................................................................
+    @classmethod
+    def brush(cls, kind, default=(254, 0, 0, 60)):
+
+        rgba = cls.BRUSH.get(kind.lower(), default)
+        qbrush = cls._qbrushes.get(rgba)
+        if qbrush is None:
+            qbrush = cls._qbrushes[rgba] = QtGui.QBrush(QtGui.QColor(*rgba))
+        return qbrush
 
     # ..................................................................................................................
     def addRegion(self, param, kind='undefined', span=None, dim='x'):
@@ -321,16 +462,16 @@ class Regions(QtCore.QObject):
 
         # Update param info with provided span or default values
         if span is None and param.value() != 'undefined':
-            span, dim = param.value().split('> ')
-            span = eval(param.value())
+            dim, span = parseSpan(param.value())
         param.setValue(f'{dim}> {span[0]:.1f}, {span[1]:.1f}')
 
         # Define
         name = f'{dim}_{self.kind}_{param.name()}'
         region = pg.LinearRegionItem(values=span, brush=self.brushcolor)
         region._name = name
+        region._key = (dim, self.kind)
         region.setRegion(span)
-        self.regionItems[name] = (region, param)
+        self.regionItems[name] = self._byKind[region._key][name] = (region, param)
 
         # events
         region.sigRegionChangeFinished.connect(partial(self.regionChanged, param))
@@ -343,20 +484,12 @@ class Regions(QtCore.QObject):
     # ..................................................................................................................
     def getLinearRegions(self, kind, dim):
 
-        regions={}
-        for k, el in self.regionItems.items():
-            if f"{dim}_{kind}_" in k:
-                regions[k] = el
-        return regions
+        return self._byKind.get((dim, kind), {})
 
     # ..................................................................................................................
     def findLinearRegion(self, name, kind, dim):
 
-        name = f'{dim}_{kind}_{name}'
-        try:
-            return self.getLinearRegions(kind, dim)[name]
-        except KeyError:
-            return {}
+        return self.getLinearRegions(kind, dim).get(f'{dim}_{kind}_{name}', {})
 
     # ..................................................................................................................
     def regionChanged(self, param, reg):
@@ -373,7 +506,8 @@ class Regions(QtCore.QObject):
 
         el, par = self.findLinearRegion(name=region.name(), kind=self.kind, dim='x')
         del self.regionItems[el._name]
-        del el
+        del self._byKind[el._key][el._name]
+        self._releaseRegionItem(el, par)
 
         self.sigRegionRemoved.emit(self, region)
 
@@ -385,13 +519,37 @@ class Regions(QtCore.QObject):
         for key in list(self.regionItems.keys()):
             region, param =  self.regionItems[key]
             del  self.regionItems[key]
-            del region
+            self._releaseRegionItem(region, param)
             self.sigRegionRemoved.emit(self, param)
+        self._byKind.clear()
+
+    # ..................................................................................................................
+    def clear(self):
+
+        # remove all regions and go back to the undefined kind (e.g., before reusing this object)
+        self.remove()
+        self.kind = 'undefined'
+        self.brushcolor = self.brush(self.kind)
+
+    # ..................................................................................................................
+    def _releaseRegionItem(self, region, param):
+
+        # break the references between the region, its parameter and this object
+        for signal, slot in [(region.sigRegionChangeFinished, None), (param.sigRemoved, self.regionRemoved),
+                             (param.sigStateChanged, self.change)]:
+            try:
+                if slot is None:
+                    signal.disconnect()
+                else:
+                    signal.disconnect(slot)
+            except TypeError:
+                # not connected
+                pass
 
     # ..................................................................................................................
     def change(self, param, data, info):
         name = param.name()
         if name == 'kind' and data == 'value':
             self.kind = info
-            self.brushcolor = self.BRUSH.get(self.kind.lower(), (254, 0, 0, 128))
+            self.brushcolor = self.brush(self.kind, (254, 0, 0, 128))
             # TODO Apply!
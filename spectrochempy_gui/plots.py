@@ -4,7 +4,7 @@
 #  Copyright (©) 2015-2021 LCS - Laboratoire Catalyse et Spectrochimie, Caen, France.
 #  CeCILL-B FREE SOFTWARE LICENSE AGREEMENT - See full LICENSE agreement in the root directory
 # ======================================================================================================================
-from functools import partial
+from functools import partial, lru_cache
 import re
 
 import numpy as np
@@ -14,9 +14,49 @@ import spectrochempy as scp
 
 from spectrochempy_gui import pyqtgraph as pg
 from spectrochempy_gui.pyqtgraph.Qt import QtCore, QtGui
-from spectrochempy_gui.pyqtgraph.functions import mkPen, mkColor
 from spectrochempy_gui.pyqtgraph import GraphicsLayoutWidget, ViewBox
 
+# ----------------------------------------------------------------------------------------------------------------------
+@lru_cache(maxsize=1)
+def colormaps():
+    """
+    Return the list of the matplotlib colormap names and a dictionary giving their index in this list.
+    """
+    names = plt.colormaps()
+    return names, {name: index for index, name in enumerate(names)}
+
+# ----------------------------------------------------------------------------------------------------------------------
+@lru_cache(maxsize=16)
+def getColormap(name):
+    """
+    Return the pyqtgraph ColorMap corresponding to a matplotlib colormap name.
+    """
+    return pg.colormap.get(name, source='matplotlib')
+
+# ----------------------------------------------------------------------------------------------------------------------
+@lru_cache(maxsize=64)
+def unitsLabel(units):
+    """
+    Return the string used to display units in the axis labels.
+    """
+    if units is not None and str(units) != 'dimensionless':
+        return r"{:~P}".format(units)
+    return ''
+
+# ----------------------------------------------------------------------------------------------------------------------
+def nearestIndex(values, coord):
+    """
+    Return the index of the element of the monotonic array `values` which is the nearest to `coord`.
+    """
+    n = values.size
+    descending = n > 1 and values[0] > values[-1]
+    if descending:
+        values = values[::-1]
+    index = int(np.searchsorted(values, coord))
+    if index >= n or (index > 0 and coord - values[index - 1] <= values[index] - coord):
+        index -= 1
+    return n - 1 - index if descending else index
+
 # ----------------------------------------------------------------------------------------------------------------------
 class CustomViewBox(ViewBox):
     """
@@ -70,9 +110,9 @@ class CustomViewBox(ViewBox):
         if self.ndim == 2:
             self.ColorMapMenu = QtGui.QMenu("Colormap")
             self.colorMapCombo = QtGui.QComboBox()
-            self.colorMapItems = plt.colormaps()
+            self.colorMapItems, colorMapIndex = colormaps()
             self.colorMapCombo.insertItems(1,self.colorMapItems)
-            self.colorMapCombo.setCurrentIndex(self.colorMapItems.index(self.prefs.colormap))
+            self.colorMapCombo.setCurrentIndex(colorMapIndex[self.prefs.colormap])
             self.colorMapCombo.activated.connect(self.emitColorMapChanged)
             self.colorMapAction = QtGui.QWidgetAction(None)
             self.colorMapAction.setDefaultWidget(self.colorMapCombo)
@@ -142,6 +182,7 @@ class PlotWidget(GraphicsLayoutWidget):
 
     _dataset = None  # current dataset associated to the plotwidget
     _autorange = True
+    _stackPens = None  # (key, pens) of the last stack plot
 
     # ..................................................................................................................
     def __init__(self, parent):
@@ -156,18 +197,85 @@ class PlotWidget(GraphicsLayoutWidget):
         self.selected_pen = None # original pen of a selected curve
         self.sigZoomReset.connect(self.zoomReset)
 
+        # Real (and masked) data of the arrays which have been displayed: id -> (array, mask, result)
+        self._maskedCache = {}
+        # Downsampled stacks of these data: id -> (array, key, result)
+        self._stackCache = {}
+
+        # Mouse moves are processed at most every 16 ms (~60 Hz)
+        self._mouseSlots = {}
+        self._pendingMoves = {}
+        self._mouseTimer = QtCore.QTimer()
+        self._mouseTimer.setSingleShot(True)
+        self._mouseTimer.setInterval(16)
+        self._mouseTimer.timeout.connect(self._updateCrosshairs)
+
     # ..................................................................................................................
     def _masked(self, data, mask):
         """
-        Utility function which returns a masked array.
+        Utility function which returns the data with NaN at the masked positions.
+
+        Plain arrays are used instead of masked arrays: the NaN values are ignored by nanmin/nanmax and are not
+        drawn by the curves (connect='finite'). They are single precision, which is enough for the display: the data
+        of the dataset are unchanged.
         """
         if self._dataset is None:
             return None
 
-        if not np.any(mask):
-            mask = np.zeros(data.shape).astype(bool)
-        data = np.ma.masked_where(mask, data)  # np.ma.masked_array(data, mask)
-        return data
+        # the result is kept as long as the same data and mask objects are displayed (e.g., when only the linewidth or
+        # the colormap changes)
+        cached = self._maskedCache.get(id(data))
+        if cached is not None and cached[0] is data and cached[1] is mask:
+            return cached[2]
+
+        # by default we plot real component of the data
+        zdata = np.ascontiguousarray(np.real(data), dtype=np.float32)
+        # the frequent "no mask" cases are detected without scanning any array
+        if not (mask is None or mask is False or mask is np.ma.nomask or not np.any(mask)):
+            zdata = np.where(mask, np.float32(np.nan), zdata)
+
+        if len(self._maskedCache) >= 8:
+            self._maskedCache.clear()
+        self._maskedCache[id(data)] = (data, mask, zdata)
+        return zdata
+
+    # ..................................................................................................................
+    def _stack(self, zdata, starts):
+        """
+        Utility function which returns the curves of a stack plot (one for each block of curves beginning at `starts`)
+        and the array of the fully masked ones (not drawn).
+        """
+        # the data returned by _masked are not modified: the result is kept as long as the same data are displayed
+        # with the same downsampling
+        key = (len(starts), zdata.shape)
+        cached = self._stackCache.get(id(zdata))
+        if cached is not None and cached[0] is zdata and cached[1] == key:
+            return cached[2]
+
+        if len(starts) < zdata.shape[0]:
+            # the maximum of each block of curves is computed in a single call (fmax ignores the masked (NaN)
+            # values, unless they are all masked)
+            reduced = np.fmax.reduceat(zdata, starts, axis=0)
+        else:
+            reduced = zdata
+        result = reduced, np.isnan(reduced).all(axis=-1)
+
+        if len(self._stackCache) >= 2:
+            self._stackCache.clear()
+        self._stackCache[id(zdata)] = (zdata, key, result)
+        return result
+
+    # ..................................................................................................................
+    @staticmethod
+    def _makePen(color, width):
+        """
+        Utility function which returns a cosmetic pen from a RGBA color (as in the colormaps).
+        """
+        # equivalent to mkPen(mkColor(color), width=width), without the argument type detection
+        pen = QtGui.QPen(QtGui.QColor(*[int(c) for c in color]))
+        pen.setWidthF(width)
+        pen.setCosmetic(True)
+        return pen
 
     # ..................................................................................................................
     @property
@@ -193,7 +301,7 @@ class PlotWidget(GraphicsLayoutWidget):
         """
         # z intensity (by default we plot real component of the data)
 
-        return self._masked(np.real(self._dataset.data), self._dataset.mask)
+        return self._masked(self._dataset.data, self._dataset.mask)
 
     # ..................................................................................................................
     @property
@@ -203,7 +311,7 @@ class PlotWidget(GraphicsLayoutWidget):
         """
         if self._dataset.processeddata is None:
             return None
-        return self._masked(np.real(self._dataset.processeddata), self._dataset.processedmask)
+        return self._masked(self._dataset.processeddata, self._dataset.processedmask)
 
     # ..................................................................................................................
     @property
@@ -213,7 +321,7 @@ class PlotWidget(GraphicsLayoutWidget):
         """
         if self._dataset.baselinedata is None:
             return None
-        return self._masked(np.real(self._dataset.baselinedata), self._dataset.mask)
+        return self._masked(self._dataset.baselinedata, self._dataset.mask)
 
     # ..................................................................................................................
     @property
@@ -223,27 +331,26 @@ class PlotWidget(GraphicsLayoutWidget):
         """
         if self._dataset.referencedata is None:
             return None
-        return self._masked(np.real(self._dataset.referencedata), self._dataset.mask)
+        return self._masked(self._dataset.referencedata, self._dataset.mask)
 
 #..................................................................................................................
     def draw_regions(self, reg=None):
 
-        procs = self.parent.controller.params.param('processing').children()
+        # only the `define regions` processes are visited
+        procs = self.parent.controller.params.param('processing').regionChildren
+        dim = self.dataset.dims[-1]
         for proc in procs:
-            if proc.name().startswith('define regions'):
-                kind = proc.param('kind').value()
-                if kind == 'undefined' or not hasattr(proc, 'regions'):
-                    return
-                dim = self.dataset.dims[-1]
-                if not proc.param('regiongroup').childs[0].value().startswith(dim):
-                    continue
+            kind = proc.param('kind').value()
+            if kind == 'undefined':
+                return
+            if not proc.param('regiongroup').childs[0].value().startswith(dim):
+                continue
 
-                for el, par in proc.regions.regionItems.values():
-                    if el._name.startswith(f"{dim}_{kind}_"):
-                        if not proc.opts['expanded']:
-                            self.p.removeItem(el)
-                        else:
-                            self.p.addItem(el, ignoreBounds=True)
+            for el, par in proc.regions.getLinearRegions(kind, dim).values():
+                if not proc.opts['expanded']:
+                    self.p.removeItem(el)
+                else:
+                    self.p.addItem(el, ignoreBounds=True)
 
     # ..................................................................................................................
     def changeColorMap(self, map):
@@ -304,6 +411,10 @@ class PlotWidget(GraphicsLayoutWidget):
                 return
             else:
                 # Try to remove the processing plotItem if it exists
+                slot = self._mouseSlots.pop(self.proc, None)
+                if slot is not None:
+                    self.proc.scene().sigMouseMoved.disconnect(slot)
+                self._pendingMoves.pop(self.proc, None)
                 self.removeItem(self.proc)
                 del self.proc
                 self.p.setTitle('')
@@ -325,14 +436,16 @@ class PlotWidget(GraphicsLayoutWidget):
         # Prepare the viewbox
         plot = kwargs.get('plotitem', self.p)
         vb = plot.vb
-        if self.dataset.ndim > 1:
+        if self.dataset.ndim > 1 and not getattr(vb, '_signalsConnected', False):
+            # connected only once: each additional connection would redraw the plot once more
             vb.sigColorMapChanged.connect(self.changeColorMap)
             vb.sigPlotModeChanged.connect(self.changePlotMode)
             vb.sigLineWidthChanged.connect(self.changeLineWidth)
+            vb._signalsConnected = True
         plot.clear()
 
-        # Copy the dataset
-        new = self.dataset.copy()
+        # The dataset is not modified here (it is only sliced to the ROI below, which gives a new object): no copy
+        new = self.dataset
         processed = kwargs.get('processed', False)
         if processed :
             zdata = self.processeddata
@@ -375,11 +488,11 @@ class PlotWidget(GraphicsLayoutWidget):
         discrete_data = False
         if x is not None and (not x.is_empty or x.is_labeled):
             xdata = x.data
-            if not np.any(xdata):
-                if x.is_labeled:
-                    discrete_data = True
-                    # take into account the fact that sometimes axis have just labels
-                    xdata = range(1, len(x.labels) + 1)
+            # only labeled coordinates may have no data: avoid scanning the data of the others
+            if x.is_labeled and not np.any(xdata):
+                discrete_data = True
+                # take into account the fact that sometimes axis have just labels
+                xdata = range(1, len(x.labels) + 1)
         else:
             xdata = range(xsize)
 
@@ -394,14 +507,16 @@ class PlotWidget(GraphicsLayoutWidget):
             if sorted(plot.getAxis('bottom').range) != [0, 1] and x.title in plot.getAxis('bottom').labelText:
                 range = plot.getAxis('bottom').range
                 range= sorted(range, reverse=True)
-                vb.setXRange(*range, padding=0)
+                xrange = range
                 print('1 - setXrange (range)', range)
             else:
-                vb.setXRange(*xlim, padding=0)
+                xrange = xlim
                 print('2 - setXrange (xlim)', xlim)
         else:
-            vb.setXRange(*xlim, padding=0)
+            xrange = xlim
             print('3 - setXrange (xlim)', xlim)
+        # the x and y ranges are set together below (the range of the view is updated only once)
+        yrange = None
 
         ndim = new._squeeze_ndim
         if ndim > 1:
@@ -437,9 +552,8 @@ class PlotWidget(GraphicsLayoutWidget):
                 if y is not None and (not y.is_empty or y.is_labeled):
                     ydata = y.data
 
-                    if not np.any(ydata):
-                        if y.is_labeled:
-                            ydata = range(1, len(y.labels) + 1)
+                    if y.is_labeled and not np.any(ydata):
+                        ydata = range(1, len(y.labels) + 1)
                 else:
                     ydata = range(ysize)
 
@@ -454,7 +568,9 @@ class PlotWidget(GraphicsLayoutWidget):
         # Amplitude (z)
         # -------------
 
-        zlim = kwargs.get('zlim', (np.ma.min(zdata), np.ma.max(zdata)))
+        # limits of the data (computed once: these are full passes on the data)
+        zmin, zmax = np.nanmin(zdata), np.nanmax(zdata)
+        zlim = kwargs.get('zlim', (zmin, zmax))
 
         method = new.meta.get('mode', prefs.method_2D) if ndim > 1 else 'stack'
 
@@ -463,7 +579,7 @@ class PlotWidget(GraphicsLayoutWidget):
             # The z axis info
             # ---------------
             amp = 0
-            zl = (np.min(np.ma.min(zdata) - amp), np.max(np.ma.max(zdata)) + amp)
+            zl = (zmin - amp, zmax + amp)
             zlim = list(kwargs.get('zlim', zl))
             zlim.sort()
             z_reverse = kwargs.get('z_reverse', False)
@@ -477,7 +593,7 @@ class PlotWidget(GraphicsLayoutWidget):
             #    ax.set_ylim(10 ** (int(np.log10(np.amin(np.abs(zdata)))) - 1),
             #                10 ** (int(np.log10(np.amax(np.abs(zdata)))) + 1))
 
-            vb.setYRange(*zlim, padding=0)
+            yrange = zlim
 
         else:
 
@@ -499,6 +615,8 @@ class PlotWidget(GraphicsLayoutWidget):
             # # ----------------
             # ax .set_ylim(ylim)
 
+        vb.setRange(xRange=xrange, yRange=yrange, padding=0)
+
 
         # Log scale
 
@@ -513,43 +631,60 @@ class PlotWidget(GraphicsLayoutWidget):
         #  ax.grid(prefs.axes_grid)  # TODO
 
         cmap = new.meta.get('colormap', prefs.colormap)
-        self.cmap = pg.colormap.get(cmap, source='matplotlib', skipCache=True)
+        self.cmap = getColormap(cmap)
 
         if method in ['stack']:
 
-            # if data.ndim == 1:
-            #    data = data.at_least2d()
+            # a 1D dataset is a single curve
+            zdata = np.atleast_2d(zdata)
 
             ncurves = zdata.shape[0]
-            colors = self.cmap.color
-            if ncurves > 1:
-                icolor = np.linspace(0, (colors.shape[0]-1), ncurves).astype(int)
-                colors = colors[icolor]
-            else:
-                colors = [colors[0]] # [prefs('color')]
-            self.colors = colors
 
             # self.curves = []
-            if hasattr(zdata, 'mask'):
-                mask = zdata.mask
-                zdata[mask] = np.nan
 
             # Downsampling
             step = 1
             if ncurves > 250:
                 step = int(ncurves / 250)
 
-            for i in np.arange(0, ncurves, step):
-                zdat = zdata[i:i + step].max(axis=0) if step > 1 else zdata[i]
-                if np.alltrue(mask):
+            starts = np.arange(0, ncurves, step)
+            reduced, hidden = self._stack(zdata, starts)
+            # the colors and pens are reused as long as the colormap, the linewidth and the number of curves do not
+            # change
+            key = (cmap, lw, ncurves, step)
+            if self._stackPens is None or self._stackPens[0] != key:
+                colors = self.cmap.color
+                # colors of the drawn curves only, spread over the colormap (integer equivalent of
+                # linspace(0, ncolors - 1, ncurves).astype(int))
+                icolor = starts * (colors.shape[0] - 1) // max(ncurves - 1, 1)
+                self.colors = colors[icolor]
+                self._stackPens = key, [self._makePen(color, lw) for color in self.colors]
+            pens = self._stackPens[1]
+
+            # only the visible points are drawn, and at most about two per pixel column (the min and max of each
+            # block, so the peaks are kept). This needs increasing x values: the (display only) order of descending
+            # coordinates is reversed, the orientation of the axis being set by invertX.
+            xplot = np.asarray(xdata)
+            if xplot.size > 1 and xplot[0] > xplot[-1]:
+                xplot = xplot[::-1]
+                reduced = reduced[:, ::-1]
+            plot.setDownsampling(auto=True, mode='peak')
+            plot.setClipToView(True)
+
+            # index of the curves, for _findCurveIndex
+            plot._curveIndex = curveIndex = {}
+
+            for k, zdat in enumerate(reduced):
+                if hidden[k]:
                     continue
-                c = pg.PlotCurveItem(
-                          x=xdata,
+                c = pg.PlotDataItem(
+                          x=xplot,
                           y=zdat,
-                          pen=mkPen(mkColor(colors[i]), width=lw),
-                          clickable=True,
+                          pen=pens[k],
                           connect='finite')
+                c.curve.setClickable(True)
                 plot.addItem(c)
+                curveIndex[c] = k
                 c.sigClicked.connect(partial(self._curveSelected, plot))
 
 
@@ -564,12 +699,7 @@ class PlotWidget(GraphicsLayoutWidget):
         # ======
 
         def make_label(ss, label):
-            if ss.units is not None and str(ss.units) != 'dimensionless':
-                units = r"{:~P}".format(ss.units)
-            else:
-                units = ''
-            label = f"{label} / {units}"
-            return label
+            return f"{label} / {unitsLabel(ss.units)}"
 
         # --------------------------------------------------------------------------------------------------------------
         # x label
@@ -649,43 +779,47 @@ class PlotWidget(GraphicsLayoutWidget):
         # plot.addItem(hLine, ignoreBounds=True)
 
         scene = plot.scene()
-        def mouseMoved(evt):
-            pos = evt
+
+        # values used at each mouse move, read once
+        xunits, xtitle = x.units, x.title
+        xvalues = np.ascontiguousarray(xdata, dtype=np.float64)
+        lld, hld = x.roi
+        zvalues, zunits, ztitle = np.real(new.data), new.units, new.title
+
+        def updateCrosshair(pos):
             scene.blockSignals(True)
             if plot.sceneBoundingRect().contains(pos):
                 mouse_point = vb.mapSceneToView(pos)
                 coord = mouse_point.x()
                 ll, hl = vb.state['viewRange'][0]
-                lld, hld = x.roi
                 if max(ll, lld) <= coord <= min(hl, hld):
-                    ds = new[:, float(coord)]
                     vLine.setVisible(True)
-                    if self.selected:
-                        try:
-                            # corresponding x index
-                            index = x.loc2index(coord)
-                            z = self.selected.yData[index] * x.units
-                            zstr = f'{z:~0.2fP} '
-
-                        except Exception:
-                            vLine.setVisible(False)
-                            scene.blockSignals(False)
-                            return   # out of limits
-                    else:
-                        z = ds.value
-                        zstr = f'{z:~0.2fP} '
+                    try:
+                        # corresponding x index
+                        if self.selected:
+                            # the selected curve may store its points in reverse order
+                            index = nearestIndex(self.selected.xData, coord)
+                            z = self.selected.yData[index] * xunits
+                        else:
+                            index = nearestIndex(xvalues, coord)
+                            z = zvalues[..., index] * zunits
+                    except Exception:
+                        vLine.setVisible(False)
+                        scene.blockSignals(False)
+                        return   # out of limits
+                    zstr = f'{z:~0.2fP} '
                     if z.size > 1:
                         # mode than one element (2D)
                         z = z.squeeze()
                         zstr = f'{z.min():~0.2fP} -- {z.max():~0.2fP} '
 
-                    coord = coord * x.units
+                    coord = coord * xunits
                     coordstr = f'{coord:~0.2fP}'
                     self.label.setText(
                             f"<span style='background-color:#FFF; font-size: 12pt'>"
-                            f"<span style='color: blue'>{x.title} = {coordstr}</span>"
+                            f"<span style='color: blue'>{xtitle} = {coordstr}</span>"
                             f"<br/>"
-                            f"<span style='color: green'>{ds.title} = {zstr}</span>"
+                            f"<span style='color: green'>{ztitle} = {zstr}</span>"
                             f"</span>")
                     vLine.setPos(mouse_point.x())
                     # hLine.setPos(mouse_point.y())
@@ -696,18 +830,35 @@ class PlotWidget(GraphicsLayoutWidget):
                     # hLine.setPos(0)
             scene.blockSignals(False)
 
-        plot.scene().sigMouseMoved.connect(mouseMoved)
+        def mouseMoved(pos):
+            # only the last position is displayed when the timer times out
+            self._pendingMoves[plot] = (updateCrosshair, pos)
+            if not self._mouseTimer.isActive():
+                self._mouseTimer.start()
+
+        # replace the slot connected by a previous drawing of this plot
+        previous = self._mouseSlots.get(plot)
+        if previous is not None:
+            try:
+                scene.sigMouseMoved.disconnect(previous)
+            except TypeError:
+                pass
+        self._pendingMoves.pop(plot, None)
+        self._mouseSlots[plot] = mouseMoved
+        scene.sigMouseMoved.connect(mouseMoved)
 
     # ..................................................................................................................
-    def _findCurveIndex(self, plot, curve):
+    def _updateCrosshairs(self):
 
-        for index, c in enumerate(plot.curves):
-            if not isinstance(c, pg.PlotCurveItem):
-                continue
-            if c is curve:
-                break
+        moves, self._pendingMoves = self._pendingMoves, {}
+        for updateCrosshair, pos in moves.values():
+            updateCrosshair(pos)
+
+    # ..................................................................................................................
+    def _findCurveIndex(self, plot, curve):
 
-        return index
+        # -1 if the curve is not one of the stacked curves of this plot
+        return getattr(plot, '_curveIndex', {}).get(curve, -1)
 
     # ..................................................................................................................
     def _curveSelected(self, plot, curve):
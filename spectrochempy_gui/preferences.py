@@ -9,25 +9,66 @@
 """
 Preferences widget
 """
+from ast import literal_eval
+from contextlib import ExitStack
 from warnings import warn
 
 import spectrochempy_gui.pyqtgraph as pg
 
 from spectrochempy_gui.pyqtgraph.Qt import QtGui, QtCore
-from spectrochempy_gui.utils import geticon
+from spectrochempy_gui.utils import qicon
 
 import spectrochempy as scp
 
+def parse_bool(s):
+    s = s.strip().lower()
+    if s in ('true', '1', 'yes'):
+        return True
+    if s in ('false', '0', 'no'):
+        return False
+    raise ValueError(s)
+
+# parsers of the edited values for the most common types of traits (the values of the other types are read as
+# python literals)
+PARSERS = {'Int': int, 'Float': float, 'Bool': parse_bool, 'Unicode': str}
+
 class PreferencePage(object):
     """
     The abstract class for the preference pages
     """
     title = None
     icon = None
+    _initialized = False
 
     def initialize(self):
         raise NotImplementedError
 
+    def initialize_once(self):
+        """
+        Initialize the page, unless it has been done since the last call to `invalidate`
+        """
+        if not self._initialized:
+            self.initialize()
+            self._initialized = True
+
+    def invalidate(self):
+        self._initialized = False
+
+class PreferenceDelegate(QtGui.QStyledItemDelegate):
+    """
+    Delegate editing the values of the preferences.
+
+    An editor is created only while a value is edited, and the value is validated when the edition is finished.
+    """
+
+    def setModelData(self, editor, model, index):
+        if editor.text() == index.data():
+            # unchanged: no validation (which would set again the preference and notify its observers)
+            return
+        super().setModelData(editor, model, index)
+        tree = self.parent()
+        tree.validate(tree.topLevelItem(index.parent().row()))
+
 class PreferencesTree(QtGui.QTreeWidget):
     """
     A QTreeWidget that can be used to display SpectroChemPy preferences
@@ -45,32 +86,54 @@ class PreferencesTree(QtGui.QTreeWidget):
         """
         super().__init__(*args, **kwargs)
         self.preferences = preferences
+        # the traits of the preferences do not change: they are introspected once
+        self._traits = dict(sorted(preferences.traits(config=True, gui=True).items()))
+        self._top_items = []
 
         self.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
         self.customContextMenuRequested.connect(self.open_menu)
+        self.menu = menu = QtGui.QMenu(self)
+        menu.addAction('Expand all').triggered.connect(self.expandAll)
+        menu.addAction('Collapse all').triggered.connect(self.collapseAll)
         self.setColumnCount(self.value_col + 1)
         self.setHeaderLabels(['preference keys', '', 'Value'])
+        # all the rows have the height of a line: the layout does not need to measure each of them
+        self.setUniformRowHeights(True)
+        self.setItemDelegateForColumn(self.value_col, PreferenceDelegate(self))
+        self.setEditTriggers(self.AllEditTriggers)
+        # the second column only contains the validation icons: fixed width
+        self.setColumnWidth(1, 2 * self.fontMetrics().height())
 
     @property
     def top_level_items(self):
-        """An iterator over the topLevelItems in this tree"""
-        return map(self.topLevelItem, range(self.topLevelItemCount()))
+        """The list of the topLevelItems in this tree"""
+        return self._top_items
 
     def initialize(self):
         """
         Fill the items of the Preferences into the tree
         """
-        preferences = self.preferences.traits(config=True, gui=True)
+        # the items are created before being added all together, with the updates of the tree disabled: the tree is
+        # laid out and painted once
+        self.setUpdatesEnabled(False)
+        self.blockSignals(True)
+        try:
+            self.clear()
+            self._top_items = self._createItems()
+            self.addTopLevelItems(self._top_items)
+            self.resizeColumnToContents(0)
+        finally:
+            self.blockSignals(False)
+            self.setUpdatesEnabled(True)
+
+    def _createItems(self):
         actualpreferences = self.preferences.config[self.preferences.name]
 
+        items = []
         vcol = self.value_col
-        for i, (key, val) in enumerate(sorted(preferences.items())):
+        for key, val in self._traits.items():
             desc = val.help
             info = val.info_text
-            try:
-                type = val.trait_types
-            except AttributeError:
-                type = val.__class__
 
             val = actualpreferences.get(key, val.default_value)
             if str(val) in ['traitlets.Undefined']:
@@ -78,57 +141,42 @@ class PreferencesTree(QtGui.QTreeWidget):
             item = QtGui.QTreeWidgetItem(0)
             item.setText(0, key)
             item.setToolTip(0, f"{key} ({info})")
-            item.setIcon(1, QtGui.QIcon(str(geticon('valid.png'))))
+            item.setIcon(1, qicon('valid.png'))
             if desc:
                 item.setText(vcol, desc)
                 item.setToolTip(vcol, desc)
             child = QtGui.QTreeWidgetItem(0)
+            child.setText(vcol, str(val))
+            child.setFlags(child.flags() | QtCore.Qt.ItemIsEditable)
             item.addChild(child)
-            self.addTopLevelItem(item)
-            editor = QtGui.QTextEdit(self)
-            # set maximal height of the editor to 1 rows
-            editor.setMaximumHeight(1.5 * QtGui.QFontMetrics(editor.font()).height())
-            editor.setPlainText(str(val))
-            self.setItemWidget(child, vcol, editor)
-            editor.textChanged.connect(self.validate(item))
-        self.resizeColumnToContents(0)
-        self.resizeColumnToContents(1)
+            items.append(item)
+        return items
 
     def validate(self, item):
-        def func():
 
-            editor = self.itemWidget(item.child(0), self.value_col)
-            s = editor.toPlainText()
+        s = item.child(0).text(self.value_col)
+        try:
+            key = item.text(0)
+            trait = self._traits[key]
+            # expected traits (no evaluation of arbitrary expressions)
             try:
-                key = item.text(0)
-                # expected traits
-                try:
-                    val = eval(s)
-                except Exception as e:
-                    val = s
-                # validation
-                trait = self.preferences.traits()[key]
-                val = trait.validate(key, val)
-
+                val = PARSERS.get(type(trait).__name__, literal_eval)(s)
             except Exception as e:
-                item.setIcon(1, QtGui.QIcon(str(geticon('invalid.png'))))
-                item.setToolTip(1, "Wrong value: %s" % e)
-                return
+                val = s
+            # validation
+            val = trait.validate(key, val)
 
-            item.setIcon(1, QtGui.QIcon(str(geticon('valid.png'))))
-            setattr(self.preferences, key, val)
+        except Exception as e:
+            item.setIcon(1, qicon('invalid.png'))
+            item.setToolTip(1, "Wrong value: %s" % e)
+            return
 
-        return func
+        item.setIcon(1, qicon('valid.png'))
+        setattr(self.preferences, key, val)
 
     def open_menu(self, position):
-        menu = QtGui.QMenu()
-        expand_all_action = QtGui.QAction('Expand all', self)
-        expand_all_action.triggered.connect(self.expandAll)
-        menu.addAction(expand_all_action)
-        collapse_all_action = QtGui.QAction('Collapse all', self)
-        collapse_all_action.triggered.connect(self.collapseAll)
-        menu.addAction(collapse_all_action)
-        menu.exec_(self.viewport().mapToGlobal(position))
+        # the menu (created once) is only shown
+        self.menu.exec_(self.viewport().mapToGlobal(position))
 
 class preferencesWidget(PreferencePage, QtGui.QWidget):
 
@@ -137,7 +185,7 @@ class preferencesWidget(PreferencePage, QtGui.QWidget):
 
     @property
     def icon(self):
-        return QtGui.QIcon(geticon('preferences.png'))
+        return qicon('preferences.png')
 
     def __init__(self, *args, **kwargs):
         super(preferencesWidget, self).__init__(*args, **kwargs)
@@ -180,7 +228,6 @@ class Preferences(QtGui.QDialog):
 
         self.bt_reset = QtGui.QPushButton('Reset to defaults')
         self.bbox = QtGui.QDialogButtonBox(QtGui.QDialogButtonBox.Ok)
-        self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
         self.setWindowTitle('Preferences')
         self.contents_widget.setMovement(QtGui.QListView.Static)
         self.contents_widget.setSpacing(1)
@@ -205,12 +252,43 @@ class Preferences(QtGui.QDialog):
 
         # Signals
         self.bbox.accepted.connect(self.accept)
-        self.bt_reset.clicked.connect(scp.reset_preferences)
+        self.bt_reset.clicked.connect(self.reset_preferences)
         self.pages_widget.currentChanged.connect(self.current_page_changed)
         self.contents_widget.currentRowChanged.connect(self.pages_widget.setCurrentIndex)
 
     def current_page_changed(self, index):
-        self.get_page(index)
+        # the pages are initialized only when they are shown
+        if self.isVisible():
+            self.get_page(index).initialize_once()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.pages_widget.count():
+            self.get_page().initialize_once()
+
+    def reset_preferences(self):
+        # the observers of the preferences displayed in the pages are notified once all the values are reset (not
+        # for each of them)
+        preferences = {}
+        for index in range(self.pages_widget.count()):
+            page_preferences = self.get_page(index).preferences
+            if page_preferences is not None:
+                preferences[id(page_preferences)] = page_preferences
+        with ExitStack() as stack:
+            for page_preferences in preferences.values():
+                stack.enter_context(page_preferences.hold_trait_notifications())
+            scp.reset_preferences()
+        # display the default values
+        self.invalidate_pages()
+        if self.pages_widget.count():
+            self.get_page().initialize_once()
+
+    def invalidate_pages(self):
+        """
+        Initialize again the pages the next time they are shown
+        """
+        for index in range(self.pages_widget.count()):
+            self.get_page(index).invalidate()
 
     def get_page(self, index=None):
         if index is None:
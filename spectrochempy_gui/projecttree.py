@@ -5,15 +5,204 @@
 #  CeCILL-B FREE SOFTWARE LICENSE AGREEMENT - See full LICENSE agreement in the root directory
 # ======================================================================================================================
 
-from functools import partial
+from collections import deque
+from functools import lru_cache
 import spectrochempy as scp
 from spectrochempy_gui.pyqtgraph.Qt import QtGui, QtCore
-from spectrochempy_gui.utils import geticon, confirm_msg
+from spectrochempy_gui.utils import qicon, confirm_msg
 
 __all__ = ['ProjectTreeWidget']
 
 # ----------------------------------------------------------------------------------------------------------------------
-class ProjectTreeWidget(QtGui.QTreeWidget):
+@lru_cache(maxsize=4096)
+def parseId(id):
+    """
+    Returns the type and the identifier from the id of a SpectroChemPy object (e.g. `NDDataset_xxxx`).
+
+    The results are kept, as the same objects are parsed each time the project is displayed again.
+    """
+    typeStr, id = id.split('_', 1)
+    return typeStr, id
+
+# ----------------------------------------------------------------------------------------------------------------------
+class ProjectNode(object):
+    """
+    Node of the project tree, associated to a SpectroChemPy object.
+
+    The children nodes are created only when they are needed (e.g., when the node is expanded).
+    """
+
+    # ..................................................................................................................
+    def __init__(self, obj=None, name='', parent=None, row=0):
+        self.obj = obj
+        self.key = name  # name of the object in its parent project
+        self.parent = parent
+        self.row = row
+        self._children = None
+        if obj is None:
+            self.name, self.typeStr, self.id = 'No project', '', ''
+            return
+        self.typeStr, self.id = parseId(obj.id)  # type(obj).__name__
+        if self.typeStr == 'Project':
+            name = obj.name
+            self.id = ' '
+        self.name = name
+
+    # ..................................................................................................................
+    @property
+    def children(self):
+        if self._children is None:
+            names = self.obj.allnames if self.typeStr == 'Project' else []
+            self._children = [ProjectNode(self.obj[k], k, self, row) for row, k in enumerate(names)]
+        return self._children
+
+    # ..................................................................................................................
+    def hasChildren(self):
+        # checked without creating the children nodes (datasets have no children)
+        if self._children is not None:
+            return bool(self._children)
+        return self.typeStr == 'Project' and bool(self.obj.allnames)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class ProjectItemModel(QtCore.QAbstractItemModel):
+    """
+    Model of the project tree.
+
+    A single column displays the names: the type and the id of the objects are read from the nodes.
+    """
+    headers = ['name']
+    project = None
+
+    # ..................................................................................................................
+    def __init__(self, project=None, parent=None):
+        super().__init__(parent)
+        self.icons = {'Project': qicon('folder.png'), 'NDDataset': qicon('file.png')}
+        self.setProject(project)
+
+    # ..................................................................................................................
+    def setProject(self, project):
+        if project is not None and project is self.project:
+            # same project: only its changes are applied, the other nodes (and the state of the view) are kept
+            top = self.topNodes[0]
+            if top.name != project.name:
+                top.name = project.name
+                index = self.index(0, 0)
+                self.dataChanged.emit(index, index)
+            self.updateNode(self.index(0, 0), top)
+            return
+        self.beginResetModel()
+        self.project = project
+        self.topNodes = [ProjectNode(project)]
+        self.endResetModel()
+
+    # ..................................................................................................................
+    def updateNode(self, index, node):
+        """
+        Remove or insert the children of a node (where they have been created) for the objects which have been
+        removed from or added to its project
+        """
+        # the subprojects are visited with a queue rather than by recursion
+        queue = deque([(index, node)])
+        while queue:
+            index, node = queue.popleft()
+            if node._children is None:
+                continue
+            self._updateChildren(index, node)
+            queue.extend((self.createIndex(row, 0, child), child) for row, child in enumerate(node._children)
+                         if child.typeStr == 'Project')
+
+    # ..................................................................................................................
+    def _updateChildren(self, index, node):
+        items = [(k, node.obj[k]) for k in node.obj.allnames]
+        current = {k: obj for k, obj in items}
+        children = node._children
+
+        def renumber(start):
+            for row in range(start, len(children)):
+                children[row].row = row
+
+        for row in reversed(range(len(children))):
+            if current.get(children[row].key) is not children[row].obj:
+                self.beginRemoveRows(index, row, row)
+                del children[row]
+                renumber(row)
+                self.endRemoveRows()
+
+        kept = [child.key for child in children]
+        keys = set(kept)
+        if kept != [k for k, obj in items if k in keys]:
+            # the order of the objects has changed: all the children are created again
+            self.beginRemoveRows(index, 0, len(children) - 1)
+            del children[:]
+            self.endRemoveRows()
+
+        for row, (k, obj) in enumerate(items):
+            if row >= len(children) or children[row].key != k:
+                self.beginInsertRows(index, row, row)
+                children.insert(row, ProjectNode(obj, k, node, row))
+                renumber(row + 1)
+                self.endInsertRows()
+
+    # ..................................................................................................................
+    def nodes(self, parent):
+        if not parent.isValid():
+            return self.topNodes
+        return parent.internalPointer().children
+
+    # ..................................................................................................................
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column, self.nodes(parent)[row])
+
+    # ..................................................................................................................
+    def parent(self, index):
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        node = index.internalPointer().parent
+        if node is None:
+            return QtCore.QModelIndex()
+        return self.createIndex(node.row, 0, node)
+
+    # ..................................................................................................................
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self.nodes(parent))
+
+    # ..................................................................................................................
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return len(self.headers)
+
+    # ..................................................................................................................
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        if not parent.isValid():
+            return True
+        if parent.column() > 0:
+            return False
+        return parent.internalPointer().hasChildren()
+
+    # ..................................................................................................................
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == QtCore.Qt.DisplayRole:
+            return node.name
+        if role == QtCore.Qt.DecorationRole and index.column() == 0:
+            return self.icons.get(node.typeStr)
+        return None
+
+    # ..................................................................................................................
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class ProjectTreeWidget(QtGui.QTreeView):
     """
     Widget for displaying spectrochempy projects
     """
@@ -32,16 +221,23 @@ class ProjectTreeWidget(QtGui.QTreeWidget):
         parent : object
         project : SpectroChemPy Project object
         """
-        QtGui.QTreeWidget.__init__(self)
+        QtGui.QTreeView.__init__(self)
         self.parent = parent
         self.setVerticalScrollMode(self.ScrollPerPixel)
-        self.setColumnCount(3)
-        self.setHeaderLabels(['name', 'type', 'id'])
+        self.setUniformRowHeights(True)
+        # the rows are created by the model when they are displayed
+        self.setModel(ProjectItemModel())
         self.setHeaderHidden(not showHeader)
-        self.setColumnHidden(1, True)
-        self.setColumnHidden(2, True)
-        self.sortByColumn(0, QtCore.Qt.AscendingOrder)
-        self.setSortingEnabled(False)
+        self.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.customContextMenuRequested.connect(self.showContextMenuEvent)
+        # the context menu is created once: only the visibility of its actions depends on the clicked node
+        self.contextMenu = QtGui.QMenu(self)
+        # self.contextMenu.addAction('Rename').triggered.connect(self.editname)
+        self.addDatasetAction = self.contextMenu.addAction('Add new dataset')
+        self.addDatasetAction.triggered.connect(self.emitAddDataset)
+        self.removeAction = self.contextMenu.addAction('Remove')
+        self.removeAction.triggered.connect(self.emitRemoveMenuNode)
+        self.menuNode = None
         self.setProject(project)
         self.clicked.connect(self.emitSelectDataset)
 
@@ -52,53 +248,25 @@ class ProjectTreeWidget(QtGui.QTreeWidget):
         ----------
         project: SpectroChemPy project object
         """
-        self.clear()
         self.project = project
-        self.buildTree(project, self.invisibleRootItem())
+        self.model().setProject(project)
+        # (the single column is stretched to the width of the view: it is not resized to its contents, which would
+        # measure all the expanded rows)
         self.expandToDepth(3)
-        self.resizeColumnToContents(0)
-        self.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
-        self.customContextMenuRequested.connect(self.showContextMenuEvent)
-
-    # ..................................................................................................................
-    def buildTree(self, obj, parent, name=''):
-        if obj is None:
-            node = QtGui.QTreeWidgetItem(['No project', ''])
-            parent.addChild(node)
-            return
-        typeStr, id = obj.id.split('_')  # type(obj).__name__
-        if typeStr == 'Project':
-            name = obj.name
-            id = ' '
-        node = QtGui.QTreeWidgetItem([name, typeStr, id])
-        parent.addChild(node)
-        if typeStr == 'Project':
-            for k in obj.allnames:
-                self.buildTree(obj[k], node, k)
-            node.setIcon(0, QtGui.QIcon(str(geticon('folder.png'))))
-        elif typeStr == 'NDDataset':
-            node.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable)  # QtCore.Qt.ItemIsUserCheckable |
-            # node.setCheckState(1, QtCore.Qt.Unchecked)
-            node.setIcon(0, QtGui.QIcon(str(geticon('file.png'))))
-        else:
-            return
 
     # ..................................................................................................................
     def showContextMenuEvent(self, event):
-        self.contextMenu = QtGui.QMenu()
         # Infos about the selected node.
         index = self.indexAt(event)
-        if not index.isValid():
+        if not index.isValid() or self.project is None:
             return
-        item = self.itemAt(event)
-        name = item.text(0)
-        if item.text(1) == 'Project':
-            # self.contextMenu.addAction('Rename').triggered.connect(partial(self.editname, item))
-            self.contextMenu.addAction('Add new dataset').triggered.connect(self.emitAddDataset)
-        if name != self.project.name:
-            # can't remove the top element without cloing the project
-            self.contextMenu.addAction('Remove').triggered.connect(partial(self.emitRemove, item))
-        self.contextMenu.popup(self.mapToGlobal(event))
+        node = index.internalPointer()
+        self.menuNode = node
+        self.addDatasetAction.setVisible(node.typeStr == 'Project')
+        # can't remove the top element without cloing the project
+        self.removeAction.setVisible(node.name != self.project.name)
+        if self.addDatasetAction.isVisible() or self.removeAction.isVisible():
+            self.contextMenu.popup(self.mapToGlobal(event))
 
     # ..................................................................................................................
     def editname(self, *args):
@@ -108,11 +276,14 @@ class ProjectTreeWidget(QtGui.QTreeWidget):
     def emitAddDataset(self):
         self.sigDatasetAdded.emit()
 
+    def emitRemoveMenuNode(self):
+        self.emitRemove(self.menuNode)
+
     def emitRemove(self, sel=None):
-        if sel is None or sel.text(0) == self.project.name:
+        if sel is None or sel.name == self.project.name:
             scp.warning_('No item selected. Please select one to remove.')
             return
-        name = sel.text(0)
+        name = sel.name
         self.sigDatasetRemoved.emit(name)
 
     # ..................................................................................................................
@@ -122,12 +293,13 @@ class ProjectTreeWidget(QtGui.QTreeWidget):
         performed, e.g., plot the corresponding data.
 
         """
-        sel = self.currentItem()
-        if sel:
+        index = self.currentIndex()
+        if index.isValid():
+            sel = index.internalPointer()
             # make a plot of the data
-            id = sel.text(2)
-            name = sel.text(0)
-            if sel.text(1) == "Project":
+            id = sel.id
+            name = sel.name
+            if sel.typeStr == "Project":
                 if name == self.project.name:
                     return
                 name = f'{name}/original'
@@ -6,14 +6,41 @@
 # ======================================================================================================================
 
 
+from functools import lru_cache
 from pathlib import Path
-from spectrochempy_gui.pyqtgraph.Qt import QtWidgets
+from spectrochempy_gui.pyqtgraph.Qt import QtGui, QtWidgets
+
+
+# directory of the ressources (icons, ...)
+RESSOURCES = Path(__file__).parent / "ressources"
 
 
 # ----------------------------------------------------------------------------------------------------------------------
+@lru_cache(maxsize=64)
 def geticon(name="scpy.png"):
 
-    return Path(__file__).parent / "ressources" / name
+    return RESSOURCES / name
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+@lru_cache(maxsize=64)
+def qicon(name="scpy.png"):
+    """
+    Return the QIcon of a ressource image (the image is read once and the icon shared by all its users).
+
+    A QApplication must exist when it is called.
+    """
+    # the image is decoded now, rather than when the icon is first painted
+    return QtGui.QIcon(QtGui.QPixmap(str(geticon(name))))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def preloadIcons(names=('scpy.png', 'folder.png', 'file.png', 'valid.png', 'invalid.png', 'preferences.png')):
+    """
+    Decode the most used icons (once the QApplication exists, e.g. when the main window is created).
+    """
+    for name in names:
+        qicon(name)
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+# ======================================================================================================================
+#  Copyright (©) 2015-2021 LCS - Laboratoire Catalyse et Spectrochimie, Caen, France.
+#  CeCILL-B FREE SOFTWARE LICENSE AGREEMENT - See full LICENSE agreement in the root directory
+# ======================================================================================================================
+"""
+Tests of the helper functions parsing the region spans and object ids, and masking the ranges of an axis.
+"""
+import numpy as np
+import pytest
+
+# the modules of the GUI need spectrochempy and a Qt binding
+pytest.importorskip('spectrochempy')
+pytest.importorskip('spectrochempy_gui.pyqtgraph.Qt')
+
+from spectrochempy_gui.controller import rangesMask
+from spectrochempy_gui.model import parseSpan
+from spectrochempy_gui.projecttree import parseId
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# rangesMask
+# ----------------------------------------------------------------------------------------------------------------------
+
+def test_rangesMask_ascending():
+    x = np.arange(10.)
+    mask = rangesMask(x, [(2., 4.), (7.5, 8.)])
+    assert mask.tolist() == [x_ in (2., 3., 4., 8.) for x_ in x]
+
+
+def test_rangesMask_descending():
+    x = np.arange(10.)[::-1]
+    mask = rangesMask(x, [(2., 4.), (7.5, 8.)])
+    assert mask.tolist() == [x_ in (2., 3., 4., 8.) for x_ in x]
+
+
+def test_rangesMask_reversed_bounds():
+    x = np.arange(10.)
+    assert np.array_equal(rangesMask(x, [(4., 2.)]), rangesMask(x, [(2., 4.)]))
+    assert np.array_equal(rangesMask(x[::-1], [(4., 2.)]), rangesMask(x[::-1], [(2., 4.)]))
+
+
+def test_rangesMask_outside_axis():
+    x = np.arange(10.)
+    assert not rangesMask(x, [(20., 30.), (-5., -1.)]).any()
+    # partially outside: clipped to the axis
+    assert rangesMask(x, [(-5., 1.)]).tolist() == [x_ <= 1. for x_ in x]
+    assert rangesMask(x[::-1], [(8., 50.)]).tolist() == [x_ >= 8. for x_ in x[::-1]]
+
+
+def test_rangesMask_no_range():
+    x = np.arange(10.)
+    assert not rangesMask(x, []).any()
+
+
+def test_rangesMask_not_monotonic():
+    x = np.array([0., 3., 1., 4., 2.])
+    assert rangesMask(x, [(1., 2.)]).tolist() == [False, False, True, False, True]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# parseSpan
+# ----------------------------------------------------------------------------------------------------------------------
+
+def test_parseSpan():
+    assert parseSpan('x> 1.0, 2.5') == ('x', (1.0, 2.5))
+    # the bounds are returned in the given order
+    assert parseSpan('y> 2.5, -1.0') == ('y', (2.5, -1.0))
+
+
+@pytest.mark.parametrize('value', ['x> __import__("os").getcwd()', 'x> 1.0 + 2.0j * a', 'x 1.0, 2.0', 'x> ', ''])
+def test_parseSpan_malformed(value):
+    # expressions are never evaluated
+    with pytest.raises((ValueError, SyntaxError)):
+        parseSpan(value)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# parseId
+# ----------------------------------------------------------------------------------------------------------------------
+
+def test_parseId():
+    assert parseId('NDDataset_1a2b') == ('NDDataset', '1a2b')
+    assert parseId('Project_1a2b') == ('Project', '1a2b')
+    # split at the first underscore only
+    assert parseId('NDDataset_1a_2b') == ('NDDataset', '1a_2b')
+
+
+def test_parseId_malformed():
+    with pytest.raises(ValueError):
+        parseId('NDDataset')